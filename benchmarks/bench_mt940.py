@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Measure the throughput of the MT940 parser on synthetic files
+
+    $ python benchmarks/bench_mt940.py --sizes 1000,100000 --output bench.json
+    $ python benchmarks/bench_mt940.py --sizes 1000,100000 --baseline bench.json
+
+The exit code is 1 when a result is worse than the baseline by more than the
+tolerance.
+"""
+from typing import Any, Dict, List, Optional
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from ofxstatement.ofx import OfxWriter
+
+from ofxstatement.plugins.mt940 import Parser, Plugin, get_bank_id, parse_bytes
+
+from mt940_generator import BANK_CODES, write_mt940
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+Result = Dict[str, Any]
+
+
+def get_sample(data_dir: str, bank_code: str, size: int) -> str:
+    """Return the name of a generated file, generating it when needed
+    """
+    filename = os.path.join(data_dir, '{}_{}.sta'.format(bank_code.lower(), size))
+    if not os.path.exists(filename):
+        with open(filename, "w") as fh:
+            write_mt940(fh, bank_code, size)
+    return filename
+
+
+def measure_phases(filename: str, settings: Dict[str, str]) -> Dict[str, float]:
+    """Return the time per phase of a conversion in seconds
+    """
+    parser = Plugin(None, dict(settings, metrics='true')).get_parser(filename)
+    try:
+        statement = parser.parse()
+    finally:
+        parser.fin.close()
+    with parser.measure('ofx'):
+        OfxWriter(statement).toxml()
+    statement.assert_valid()
+
+    assert parser.metrics is not None
+    return {phase: totals['seconds'] for phase, totals in parser.metrics.as_dict()['phases'].items()}
+
+
+def parse(filename: str, settings: Dict[str, str]) -> int:
+    parser: Parser = Plugin(None, settings).get_parser(filename)
+    try:
+        return len(parser.parse().lines)
+    finally:
+        parser.fin.close()
+
+
+def parse_threads(filename: str, settings: Dict[str, str], threads: int) -> int:
+    """Parse the file in memory with parse_bytes() in several threads at once
+    """
+    with open(filename, "rb") as fh:
+        data = fh.read()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(lambda _: len(parse_bytes(data, settings).lines), range(threads)))
+
+
+def measure(filename: str,
+            bank_code: str,
+            size: int,
+            settings: Dict[str, str],
+            repeat: int,
+            memory: bool,
+            threads: int = 1) -> Result:
+    """Return the best time, throughput, peak memory and phase times of
+    Parser.parse()
+
+    With more than one thread the file is parsed that many times at once
+    and the throughput is for all threads together.
+    """
+    settings = dict(settings, bank_code=bank_code, bank_id=get_bank_id(bank_code))
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        nr_lines = parse(filename, settings) if threads == 1 else parse_threads(filename, settings, threads)
+        seconds.append(time.perf_counter() - start)
+        assert nr_lines == size * threads, "Expected {} lines, got {}".format(size * threads, nr_lines)
+
+    result: Result = {'bank_code': bank_code,
+                      'size': size,
+                      'threads': threads,
+                      'seconds': min(seconds),
+                      'transactions_per_second': size * threads / min(seconds),
+                      'peak_memory': None,
+                      'phases': measure_phases(filename, settings)}
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        parse(filename, settings)
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+
+def compare(results: List[Result], baseline: List[Result], tolerance: float) -> List[str]:
+    """Return the regressions compared to the baseline
+    """
+    regressions = []
+    expected = {(r['bank_code'], r['size']): r for r in baseline}
+    for result in results:
+        base = expected.get((result['bank_code'], result['size']))
+        if base is None:
+            continue
+        name = '{} {}'.format(result['bank_code'], result['size'])
+        if result['transactions_per_second'] < base['transactions_per_second'] * (1 - tolerance):
+            regressions.append('{}: {:.0f} transactions/s, baseline {:.0f}'.format(
+                name, result['transactions_per_second'], base['transactions_per_second']))
+        if result['peak_memory'] and base['peak_memory'] and \
+           result['peak_memory'] > base['peak_memory'] * (1 + tolerance):
+            regressions.append('{}: peak memory {} bytes, baseline {}'.format(
+                name, result['peak_memory'], base['peak_memory']))
+    return regressions
+
+
+def report(result: Result) -> None:
+    phases = ' '.join('{}={:.3f}s'.format(k, v) for k, v in result['phases'].items())
+    memory = '-' if result['peak_memory'] is None else '{:.1f}MB'.format(result['peak_memory'] / 1e6)
+    print('{:8} {:>8} {:8.3f}s {:>10.0f}/s {:>9} {}'.format(
+        result['bank_code'], result['size'], result['seconds'], result['transactions_per_second'], memory, phases))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the MT940 parser.")
+    parser.add_argument("--banks", default=','.join(BANK_CODES), help="comma separated bank codes (default all)")
+    parser.add_argument("--sizes", default=','.join(map(str, SIZES)), help="comma separated numbers of transactions")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one counts (default 3)")
+    parser.add_argument("--threads", type=int, default=1, help="number of threads parsing at once (default 1)")
+    parser.add_argument("--no-memory", action="store_true", help="do not measure the peak memory")
+    parser.add_argument("--setting", action="append", default=[], metavar="KEY=VALUE", help="plugin setting")
+    parser.add_argument("--data-dir", default=os.path.join('build', 'benchmarks'), help="directory for the generated files")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", help="JSON file with the results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    settings = dict(setting.split('=', 1) for setting in args.setting)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    for bank_code in args.banks.upper().split(','):
+        for size in map(int, args.sizes.split(',')):
+            filename = get_sample(args.data_dir, bank_code, size)
+            result = measure(filename, bank_code, size, settings, args.repeat, not args.no_memory, args.threads)
+            report(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({'python': sys.version,
+                       'platform': platform.platform(),
+                       'settings': settings,
+                       'results': results}, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as fh:
+            regressions = compare(results, json.load(fh)['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
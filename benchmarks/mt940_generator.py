@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Generate synthetic MT940 files for every bank dialect
+
+The files look like the bank samples in tests/samples: a statement (tag 20
+up to and including tag 62F) per day with a matching opening and closing
+balance.
+
+    $ python benchmarks/mt940_generator.py ING 100000 ing_100k.sta
+"""
+from typing import Callable, Dict, IO, List, Tuple
+
+import argparse
+import datetime
+import random
+
+BANK_CODES = ['ASN', 'MBANK', 'ABNAMRO', 'ING', 'KNAB', 'RABO', 'SNS', 'TRIODOS']
+
+NAMES = ['hr gjlm paulissen', 'international card services', 'transfer solutions bv',
+         'albert heijn 1234', 'kpn b.v.', 'belastingdienst', 'stichting wonen',
+         'vattenfall klantenservice', 'ns groep', 'bol.com b.v.']
+DESCRIPTIONS = ['Betaling sieraden', 'INTERNE OVERBOEKING VIA MOBIEL', 'Huur januari',
+                'Termijnbedrag energie', 'Abonnement mobiel', 'Boodschappen',
+                'Kosten gebruik betaalrekening', 'Salaris', 'Terugbetaling', 'Factuur']
+
+# statement line (tag 61) and transaction details (tag 86) of a transaction
+Record = Tuple[str, str]
+
+
+def format_amount(cents: int, width: int = 0) -> str:
+    """Return an absolute amount with a decimal comma, e.g. 12,34
+    """
+    text = '{},{:02d}'.format(abs(cents) // 100, abs(cents) % 100)
+    return text.rjust(width, '0') if width else text
+
+
+def iban(rng: random.Random, bank: str = 'INGB') -> str:
+    return 'NL{:02d}{}{:010d}'.format(rng.randint(10, 99), bank, rng.randint(0, 9999999999))
+
+
+def record_asn(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    account, name = iban(rng), rng.choice(NAMES)
+    description = '{} {}'.format(rng.choice(DESCRIPTIONS), nr).ljust(65)
+    statement_line = '{:%y%m%d%m%d}{}{}NOVB{}\n{}'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents), account, name)
+    empty = ' ' * 65
+    details = '\n'.join([account + ' ' + name, empty, description, empty, empty, empty])
+    return statement_line, details
+
+
+def record_sns(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    account, name = '{:010d}'.format(rng.randint(0, 9999999999)), rng.choice(NAMES)
+    description = '{} {}'.format(rng.choice(DESCRIPTIONS), nr).ljust(65)
+    statement_line = '{:%y%m%d%m%d}{}{}NIOB{}\n{}'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents), account, name)
+    empty = ' ' * 65
+    details = '\n'.join([account + ' ' + name, empty, description, empty, empty])
+    return statement_line, details
+
+
+def record_mbank(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d%m%d}{}N{}NTRFNONREF//MB{:%y%m%d}{:06d}\n911-TRANSAKCJA IPH'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents), date, nr % 1000000)
+    details = '911 TRANSAKCJA COLLECT; ID IPH: XX{:012d}; Z RACH.: \n' \
+              '56114010810000267002001001; OD: JAN NOWAK  \n' \
+              'UL. NIJAKA 1 M 2 31-234 KRAKOW; TYT.: {}   ; \n' \
+              'TNR: {:015d}.010001'.format(nr, rng.choice(DESCRIPTIONS).upper(), rng.randint(0, 10 ** 15 - 1))
+    return statement_line, details
+
+
+def record_abnamro(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d%m%d}{}{}N426NONREF'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents))
+    details = 'BEA   NR:XXX1234   {:%d.%m.%y}/12.54 {} FIL{:04d},PAS999\n{}'.format(
+        date, rng.choice(NAMES).upper(), nr % 10000, rng.choice(DESCRIPTIONS).upper())
+    return statement_line, details
+
+
+def record_ing(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d}{}{}NTRFNONREF'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents))
+    details = '{:010d} {} {}\nBetaling transactiedatum: {:%d-%m-%Y}'.format(
+        rng.randint(0, 9999999999), rng.choice(NAMES), nr, date)
+    return statement_line, details
+
+
+def record_knab(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d%m%d}{}{}NTRFNONREF//B{:015d}'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents), nr)
+    details = '{} {}\nREK: {}/NAAM: {}'.format(
+        rng.choice(DESCRIPTIONS).upper(), nr, iban(rng), rng.choice(NAMES).upper())
+    return statement_line, details
+
+
+def record_rabo(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d}{}{}N044{:010d}      {}'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents, 15),
+        rng.randint(0, 9999999999), rng.choice(NAMES).upper().ljust(33))
+    details = '\n'.join(':86:' + text.ljust(64) if i else text.ljust(64)
+                        for i, text in enumerate(['BETALINGSKENM.  {:09d}'.format(nr),
+                                                  rng.choice(DESCRIPTIONS).upper()]))
+    return statement_line, details
+
+
+def record_triodos(rng: random.Random, date: datetime.date, cents: int, nr: int) -> Record:
+    statement_line = '{:%y%m%d}{}{}N000NONREF'.format(
+        date, 'D' if cents < 0 else 'C', format_amount(cents))
+    details = '000>10{:012d}\n>20{}>21{}\n>310390123456'.format(
+        nr, rng.choice(DESCRIPTIONS).upper()[:27], rng.choice(NAMES).upper()[:27])
+    return statement_line, details
+
+
+RECORDS: Dict[str, Callable[[random.Random, datetime.date, int, int], Record]] = {
+    'ASN': record_asn,
+    'MBANK': record_mbank,
+    'ABNAMRO': record_abnamro,
+    'ING': record_ing,
+    'KNAB': record_knab,
+    'RABO': record_rabo,
+    'SNS': record_sns,
+    'TRIODOS': record_triodos,
+}
+
+ACCOUNTS = {
+    'ASN': 'NL81ASNB9999999999',
+    'MBANK': 'PL29114010810000267002001002',
+    'ABNAMRO': '517852257',
+    'ING': '0001234567',
+    'KNAB': '123456789',
+    'RABO': '1291.99.348EUR',
+    'SNS': '0123456789',
+    'TRIODOS': 'TRIODOSBANK/0390123456',
+}
+
+
+def write_mt940(fh: IO[str],
+                bank_code: str,
+                nr_transactions: int,
+                per_statement: int = 100,
+                seed: int = 0) -> None:
+    """Write a synthetic MT940 file with nr_transactions transactions
+
+    There is a statement per day with at most per_statement transactions.
+    """
+    bank_code = bank_code.upper()
+    record = RECORDS[bank_code]
+    account = ACCOUNTS[bank_code]
+    currency = 'PLN' if bank_code == 'MBANK' else 'EUR'
+    rng = random.Random(seed)
+    date = datetime.date(2000, 1, 1)
+    balance = 100000
+    nr = 0
+
+    while nr < nr_transactions:
+        records: List[Record] = []
+        opening_balance = balance
+        for nr in range(nr, min(nr + per_statement, nr_transactions)):
+            cents = rng.randint(-50000, 50000) or 1
+            balance += cents
+            records.append(record(rng, date, cents, nr))
+        nr += 1
+
+        if bank_code == 'ASN':
+            fh.write('{1:F01ASNBNL21XXXX0000000000}{2:O940ASNBNL21XXXXN}{3:}{4:\n')
+        fh.write(':20:{:%y%m%d}{:06d}\n:25:{}\n:28C:{}/1\n'.format(date, nr, account, date.toordinal() % 100000))
+        fh.write(':60F:{}{:%y%m%d}{}{}\n'.format('D' if opening_balance < 0 else 'C', date, currency, format_amount(opening_balance)))
+        for statement_line, details in records:
+            fh.write(':61:{}\n:86:{}\n'.format(statement_line, details))
+        fh.write(':62F:{}{:%y%m%d}{}{}\n'.format('D' if balance < 0 else 'C', date, currency, format_amount(balance)))
+        fh.write('-}{5:}\n' if bank_code == 'ASN' else '-\n')
+        date += datetime.timedelta(days=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic MT940 file.")
+    parser.add_argument("bank_code", choices=BANK_CODES, type=str.upper)
+    parser.add_argument("nr_transactions", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--per-statement", type=int, default=100, help="transactions per statement (default 100)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.output, "w") as fh:
+        write_mt940(fh, args.bank_code, args.nr_transactions, args.per_statement, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -92,6 +92,9 @@ if __name__ == '__main__':
         ],
         entry_points={
             'ofxstatement':
-            ['mt940 = ofxstatement.plugins.mt940:Plugin']
+            ['mt940 = ofxstatement.plugins.mt940:Plugin'],
+            'console_scripts':
+            ['ofxstatement-mt940-batch = ofxstatement.plugins.mt940_batch:main',
+             'ofxstatement-mt940-watch = ofxstatement.plugins.mt940_watch:main'],
         },
     )
@@ -1,29 +1,58 @@
 # -*- coding: utf-8 -*-
-from typing import Set, Iterator, Any, IO
+from typing import Set, Iterator, Iterable, Any, IO, List, Dict, Optional, Tuple, ContextManager, Union, Sequence
 
 import sys
-from decimal import Decimal
 import datetime
+import io
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import logging
 from pprint import pformat
 import re
+from decimal import Decimal
 
 from mt940.processors import mBank_set_transaction_code, mBank_set_iph_id, mBank_set_tnr
-from mt940.tags import StatementASNB
+from mt940.processors import date_cleanup_post_processor, transactions_to_transaction
+from mt940.tags import StatementASNB, Tag
 from mt940.models import Transaction, Transactions
 
 from ofxstatement.plugin import Plugin as BasePlugin
+from ofxstatement.ui import UI
 from ofxstatement.parser import StatementParser as BaseStatementParser
 from ofxstatement.statement import StatementLine, BankAccount
 from ofxstatement.statement import generate_unique_transaction_id
-
-from ofxstatement.plugins.statement import Statement
+from ofxstatement.exceptions import ValidationError
+
+from ofxstatement.plugins.statement import Statement, Totals
+from ofxstatement.plugins.mt940_trace import Trace
+from ofxstatement.plugins.mt940_metrics import Metrics
+from ofxstatement.plugins.mt940_ledger import Ledger
+from ofxstatement.plugins.mt940_cache import Cache
+from ofxstatement.plugins.mt940_native import parse as native_parse
+from ofxstatement.plugins.mt940_input import MappedFile, BytesFile, AUTO
+from ofxstatement.plugins.mt940_columns import LineColumns
+from ofxstatement.plugins.mt940_details import get_details
+from ofxstatement.plugins.mt940_merge import MergeIndex, get_opening_balance, sort_files
 
 # Need Python 3 for super() syntax
 assert sys.version_info[0] >= 3, "At least Python 3 is required."
 
 logger = logging.getLogger(__name__)
 
+STATEMENT_START_RE = re.compile(r'^:20:', re.MULTILINE)
+
+ACCOUNT_RE = re.compile(r'^:25:(.*)$', re.MULTILINE)
+
+ENGINES = ('mt940', 'native')
+
+# The tags and processors of the bank dialects are created once and shared
+# by all parsers, also in other threads: a tag only holds its compiled
+# pattern and the processors are plain functions.
+# mt940/tree/develop/mt940_tests/test_tags.py
+ASNB_TAGS: Dict[Union[int, str], Tag] = {StatementASNB.id: StatementASNB()}
+# mt940/tree/develop/mt940_tests/test_processors.py
+MBANK_PROCESSORS = [mBank_set_transaction_code, mBank_set_iph_id, mBank_set_tnr]
+
 
 def get_bank_id(bank_code: str) -> str:
     bic_codes = {'ASN': 'ASNBNL21',
@@ -37,104 +66,557 @@ def get_bank_id(bank_code: str) -> str:
     return bic_codes[bank_code.upper()]
 
 
+class StatementBalances:
+    """Processors that copy the opening and closing balance of a bank
+    statement to its last transaction
+
+    The closing balance follows the transactions, so it is attached to the
+    last transaction that was added after the opening balance, if any.
+    """
+
+    last: Optional[Transaction]
+    opening_balance: Any
+
+    def __init__(self) -> None:
+        self.last = None
+        self.opening_balance = None
+
+    def opening(self, transactions: Transactions, tag: Any, tag_dict: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        self.last = transactions.transactions[-1] if transactions.transactions else None
+        self.opening_balance = result[tag.slug]
+        return result
+
+    def closing(self, transactions: Transactions, tag: Any, tag_dict: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        last = transactions.transactions[-1] if transactions.transactions else None
+        if last is not None and last is not self.last and self.opening_balance is not None:
+            last.data['statement_opening_balance'] = self.opening_balance
+            last.data['statement_closing_balance'] = result[tag.slug]
+        return result
+
+
+def create_transactions(bank_code: str, bank_id: Optional[str]) -> Transactions:
+    """Return an empty Transactions object for the bank dialect
+    """
+    balances = StatementBalances()
+    # copy the account to every transaction too
+    processors: Dict[str, List[Any]] = dict(
+        post_statement=[
+            date_cleanup_post_processor,
+            transactions_to_transaction('transaction_reference', 'account_identification'),
+        ],
+        post_opening_balance=[balances.opening],
+        post_final_opening_balance=[balances.opening],
+        post_intermediate_opening_balance=[balances.opening],
+        post_closing_balance=[balances.closing],
+        post_final_closing_balance=[balances.closing],
+        post_intermediate_closing_balance=[balances.closing],
+    )
+
+    if bank_code == 'ASN' or bank_id == get_bank_id('ASN'):
+        # the tags are copied by Transactions
+        return Transactions(processors=processors, tags=ASNB_TAGS)
+    elif bank_code == 'MBANK' or bank_id == get_bank_id('MBANK'):
+        return Transactions(processors=dict(
+            processors,
+            post_transaction_details=MBANK_PROCESSORS,
+        ))
+    else:
+        return Transactions(processors=processors)
+
+
+def split_statements(data: str) -> List[str]:
+    """Split MT940 data into chunks each starting with a transaction
+    reference (tag 20)
+
+    Anything before the second transaction reference belongs to the first
+    chunk.
+    """
+    starts = [m.start() for m in STATEMENT_START_RE.finditer(data)][1:]
+    return [data[begin:end] for begin, end in zip([0] + starts, starts + [len(data)])]
+
+
+def get_account(data: str) -> str:
+    """Return the account identification (tag 25) of MT940 data
+    """
+    m = ACCOUNT_RE.search(data)
+    return m.group(1).strip() if m else ''
+
+
+def parse_native(trs: Transactions, data: str) -> bool:
+    """Parse MT940 data with the native engine
+
+    Returns False when the data must be parsed by the mt940 library with
+    new Transactions instead.
+    """
+    try:
+        native_parse(trs, data)
+    except Exception as e:
+        logger.debug('Falling back to the mt940 library: %s', e)
+        return False
+    return True
+
+
+def parse_statements(args: Tuple[str, str, Optional[str], str]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Parse MT940 data in a worker process
+
+    Returns the statement data and the data of every transaction.
+    """
+    data, bank_code, bank_id, engine = args
+    trs = create_transactions(bank_code, bank_id)
+    if engine == 'native':
+        if parse_native(trs, data):
+            return trs.data, [transaction.data for transaction in trs]
+        trs = create_transactions(bank_code, bank_id)
+    trs.parse(data)
+    return trs.data, [transaction.data for transaction in trs]
+
+
 class Parser(BaseStatementParser):
+    statement: Statement
     unique_id_set: Set[str]
-
-    def __init__(self, fin: IO[str], bank_code: str, bank_id: str, end_date_derived_from_statements: bool = False) -> None:
+    trace: Optional[Trace]
+    metrics: Optional[Metrics]
+    ledger: Optional[Ledger]
+    totals: Totals
+    cache: Optional[Cache]
+    cache_key: Optional[str]
+    merged: Optional[List[MappedFile]]
+
+    def __init__(self,
+                 fin: Union[IO[str], MappedFile],
+                 bank_code: str,
+                 bank_id: str,
+                 end_date_derived_from_statements: bool = False,
+                 streaming: bool = False,
+                 workers: int = 1,
+                 trace: int = 0,
+                 metrics: bool = False,
+                 metrics_file: Optional[str] = None,
+                 ledger: Optional[str] = None,
+                 cache: Optional[Cache] = None,
+                 check_balances: bool = False,
+                 engine: str = 'mt940',
+                 compact: bool = False,
+                 structured_details: bool = False) -> None:
         super().__init__()
         self.statement = Statement(bank_id=bank_id)
         self.fin = fin
         self.bank_code = bank_code.upper()
         self.end_date_derived_from_statements = end_date_derived_from_statements
+        self.streaming = streaming
+        self.workers = workers
+        self.trace = Trace(trace) if trace > 0 else None
         self.unique_id_set = set()
+        self.generate_unique_transaction_id = generate_unique_transaction_id
+        self.ledger = Ledger(ledger) if ledger else None
+        self.nr_skipped = 0
+        self.totals = Totals()
+        self.check_balances = check_balances
+        if engine not in ENGINES:
+            raise ValueError("Engine should be one of {}, not '{}'".format(', '.join(ENGINES), engine))
+        self.engine = engine
+        self.compact = compact
+        self.structured_details = structured_details
+        # the memo, payee and counter account are read from the subfields
+        # of the transaction details in the format of the bank
+        self.dialect = self.bank_code if structured_details else None
+        if compact:
+            # the lines are created again when they are used
+            self.statement.lines = LineColumns()
+        # the key is set by Plugin.get_parser() since it needs the file contents
+        self.cache = cache
+        self.cache_key = None
+        # the files to merge are set by Plugin.get_merge_parser()
+        self.merged = None
+        self.metrics = None
+        if metrics or metrics_file:
+            # measure by wrapping so there is no overhead without metrics
+            self.metrics = Metrics(metrics_file, getattr(fin, 'name', None))
+            self.parse = self.metrics.wrap('parse', self.parse)  # type: ignore
+            self.parse_record = self.metrics.wrap('parse_record', self.parse_record)  # type: ignore
+            self.generate_unique_transaction_id = \
+                self.metrics.wrap('generate_unique_transaction_id', generate_unique_transaction_id)
 
     def parse(self) -> Statement:
         """Main entry point for parsers
 
-        super() implementation will call to split_records and parse_record to
-        process the file.
+        Returns the statement with all its lines, see parse_lines() for
+        getting the lines one by one.
+        """
+
+        if self.cache is not None and self.cache_key is not None:
+            cached = self.cache.get(self.cache_key)
+            if cached is not None:
+                if self.metrics is not None:
+                    self.metrics.nr_transactions = len(cached.lines)
+                    cached.metrics = self.metrics
+                return cached
+
+        stmt = self.statement
+        for stmt_line in self.parse_lines():
+            stmt.lines.append(stmt_line)
+        self.finish()
+
+        if self.cache is not None and self.cache_key is not None:
+            self.cache.put(self.cache_key, stmt)
+
+        return stmt
+
+    def parse_accounts(self) -> List[Statement]:
+        """Return a statement per account (tag 25) in the order of the input
+
+        The MT940 statements of every account are parsed on their own, by a
+        pool of worker processes when there is more than one worker. The
+        cache and the metrics are not used. The statements share the ledger
+        of the parser, which is locked before the accounts are parsed.
+        """
+        groups: Dict[str, List[str]] = {}
+        try:
+            for data in self.read_statements():
+                groups.setdefault(get_account(data), []).append(data)
+        finally:
+            self.close()
+        bank_id = self.statement.bank_id
+        assert bank_id is not None
+        if self.ledger is not None:
+            self.ledger.acquire()
+        args = [(''.join(chunks),
+                 self.bank_code,
+                 bank_id,
+                 self.end_date_derived_from_statements,
+                 0 if self.trace is None else self.trace.entries.maxlen,
+                 None if self.ledger is None else self.ledger.filename,
+                 self.check_balances,
+                 self.engine,
+                 self.compact,
+                 self.structured_details) for chunks in groups.values()]
+
+        if self.workers > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(args))) as executor:
+                results = list(executor.map(parse_account, args))
+        else:
+            results = [parse_account(arg) for arg in args]
+
+        statements = []
+        for statement, pending in results:
+            if self.ledger is not None:
+                statement.ledger = self.ledger
+                statement.ledger.pending.extend(pending)
+            statements.append(statement)
+        return statements
+
+    def parse_lines(self) -> Iterator[StatementLine]:
+        """Return the statement lines as soon as they are parsed
+
+        Like StatementParser.parse() this calls split_records and
+        parse_record, but the lines are not added to the statement. Call
+        finish() afterwards to complete the statement.
         """
+        try:
+            for record in self.split_records():
+                self.cur_record += 1
+                if not record:
+                    continue
+                stmt_line = self.parse_record(record)
+                if stmt_line:
+                    stmt_line.assert_valid()
+                    yield stmt_line
+        except Exception:
+            if self.trace is not None:
+                self.trace.dump()
+            raise
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Release the input when it was opened by Plugin.get_parser()
+        """
+        if isinstance(self.fin, MappedFile):
+            self.fin.close()
 
-        stmt: Statement = super().parse()
+    def get_cache_settings(self) -> Tuple[Any, ...]:
+        """Return the settings that change the statement, for the cache key
 
-        logger.debug('trs.data:\n' + pformat(self.trs.data, indent=4))
+        The input encoding is the effective one of the file. Settings like
+        engine, workers or streaming only change the way it is parsed and are
+        left out.
+        """
+        return (getattr(self.fin, 'encoding', None),
+                self.bank_code,
+                self.statement.bank_id,
+                self.end_date_derived_from_statements,
+                self.check_balances,
+                self.structured_details)
+
+    def finish(self) -> Statement:
+        """Complete the statement header after all lines have been parsed
+        """
+        stmt = self.statement
+        totals = stmt.totals = self.totals
+        if self.trace is not None:
+            stmt.trace = self.trace
+        if self.metrics is not None:
+            self.metrics.nr_transactions = totals.nr_lines
+            stmt.metrics = self.metrics
+        if self.ledger is not None:
+            if self.nr_skipped:
+                logger.info('Skipped %d transaction(s) already in ledger %s', self.nr_skipped, self.ledger.filename)
+            stmt.ledger = self.ledger
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('trs.data:\n%s', pformat(self.trs.data, indent=4))
 
         stmt.account_id = self.trs.data['account_identification']
 
         # There is no information about the initial opening balance just the
         # final opening balance (on the same day as the final closing balance)
         stmt.currency = self.trs.data['final_closing_balance'].amount.currency
-        stmt.end_balance = \
-            Decimal(str(self.trs.data['final_closing_balance'].amount.amount))
+        stmt.end_balance = self.trs.data['final_closing_balance'].amount.amount
         stmt.end_date = self.trs.data['final_closing_balance'].date
-        if self.end_date_derived_from_statements:
-            stmt.end_date = max(stmt.end_date, max(sl.date for sl in stmt.lines))
+        if self.end_date_derived_from_statements and totals.max_date is not None:
+            stmt.end_date = max(stmt.end_date, totals.max_date)
+        # there may be no lines left when the ledger is used
+        stmt.start_date = stmt.end_date if totals.min_date is None else totals.min_date
         stmt.end_date += datetime.timedelta(days=1)  # exclusive for OFX
 
-        stmt.start_date = min(sl.date for sl in stmt.lines)
-        total_amount = sum(sl.amount for sl in stmt.lines)
-        stmt.start_balance = stmt.end_balance - total_amount
+        end_balance = totals.to_units(stmt.end_balance)
+        stmt.start_balance = totals.from_units(end_balance - totals.units)
 
         return stmt
 
     def split_records(self) -> Iterator[Any]:
         """Return iterable object consisting of a line per transaction
         """
-        data = self.fin.read()
-        # To solve PEP8 E127 continuation line over-indented for visual indent
-        bank_id = self.statement.bank_id
-
-        if self.bank_code == 'ASN' or bank_id == get_bank_id('ASN'):
-            # mt940/tree/develop/mt940_tests/test_tags.py
-            tag_parser = StatementASNB()
-            self.trs = Transactions(tags={
-                tag_parser.id: tag_parser
-            })
-        elif self.bank_code == 'MBANK' or bank_id == get_bank_id('MBANK'):
-            # mt940/tree/develop/mt940_tests/test_processors.py
-            self.trs = Transactions(processors=dict(
-                post_transaction_details=[
-                    mBank_set_transaction_code,
-                    mBank_set_iph_id,
-                    mBank_set_tnr,
-                ],
-            ))
+        self.trs = self.create_transactions()
+
+        if self.merged is not None:
+            yield from self.merge_records()
+        elif self.workers > 1:
+            yield from self.parallel_records()
+        elif self.streaming:
+            yield from self.stream_records()
+        elif isinstance(self.fin, MappedFile):
+            self.parse_by_statement()
+            for transaction in self.trs:
+                yield transaction
         else:
-            self.trs = Transactions()
-
+            with self.measure('read'):
+                data = self.fin.read()
+            self.parse_data(data)
+            for transaction in self.trs:
+                yield transaction
+
+    def create_transactions(self) -> Transactions:
+        trs = create_transactions(self.bank_code, self.statement.bank_id)
+        if self.metrics is not None:
+            trs.parse = self.metrics.wrap('mt940', trs.parse)  # type: ignore
+        return trs
+
+    def parse_data(self, data: str) -> None:
+        """Parse MT940 data with the engine, falling back to the mt940
+        library when the native engine can not handle it
+        """
+        if self.engine == 'native':
+            with self.measure('native'):
+                if parse_native(self.trs, data):
+                    return
+            self.trs = self.create_transactions()
         self.trs.parse(data)
-        for transaction in self.trs:
-            yield transaction
 
-    def parse_record(self, transaction: Transaction) -> StatementLine:
+    def parse_by_statement(self) -> None:
+        """Parse MT940 data statement by statement with the engine, falling
+        back to the mt940 library for all statements when the native engine
+        can not handle one
+
+        The mt940 library keeps its state between the statements, so this
+        gives the same transactions as parsing all data at once.
+        """
+        if self.engine == 'native':
+            with self.measure('native'):
+                if all(parse_native(self.trs, data) for data in self.read_statements()):
+                    return
+            self.trs = self.create_transactions()
+        for data in self.read_statements():
+            self.trs.parse(data)
+
+    def read_statements(self) -> Iterable[str]:
+        """Return the MT940 data of every statement (tag 20)
+
+        A memory mapped file is decoded statement by statement while
+        iterating.
+        """
+        if not isinstance(self.fin, MappedFile):
+            with self.measure('read'):
+                return split_statements(self.fin.read())
+        statements: Iterator[str] = self.fin.statements()
+        if self.metrics is not None:
+            statements = self.metrics.iterate('read', statements)
+        return statements
+
+    def stream_records(self) -> Iterator[Transaction]:
+        """Return the transactions while reading the input line by line
+
+        The lines are collected till the next statement line (tag 61) and
+        then handed over to the MT940 parser, that keeps its state
+        (currency, transaction reference, ...) between calls. A transaction
+        is only complete when the next one starts, since transaction details
+        (tag 86) may even follow the closing balance (tag 62F).
+
+        The native engine is not used here, since it can not fall back to
+        the mt940 library once transactions have been returned.
+        """
+        block: List[str] = []
+        for line in self.fin:
+            if line.startswith(':61:') and block:
+                self.trs.parse(''.join(block))
+                block = []
+                yield from self.pop_transactions(keep_last=True)
+            block.append(line)
+
+        if block:
+            self.trs.parse(''.join(block))
+        yield from self.pop_transactions(keep_last=False)
+
+    def parallel_records(self) -> Iterator[Transaction]:
+        """Return the transactions while parsing the statements in parallel
+
+        The input is split into statements (tag 20) that are parsed by a pool
+        of worker processes. The results are returned in the original order
+        so parse_record() generates the same unique ids as a serial run.
+        """
+        chunks = list(self.read_statements())
+        chunksize = max(1, len(chunks) // (4 * self.workers))
+        args = [(chunk, self.bank_code, self.statement.bank_id, self.engine) for chunk in chunks]
+        previous: Optional[Dict[str, Any]] = None
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results: Iterable[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = \
+                executor.map(parse_statements, args, chunksize=chunksize)
+            if self.metrics is not None:
+                results = self.metrics.iterate('mt940', results)
+            for data, transactions in results:
+                self.check_continuity(previous, data)
+                self.trs.data.update(data)
+                for transaction_data in transactions:
+                    yield Transaction(self.trs, transaction_data)
+                previous = data
+
+    def merge_records(self) -> Iterator[Transaction]:
+        """Return the transactions of the files to merge without the ones
+        the files before had already
+
+        The files are parsed one at a time in the order of their first
+        opening balance, see MergeIndex. The duplicates still count for
+        checking the balance of their bank statement. The statement ends
+        with the closing balance of the file ending last and like for one
+        file its start balance follows from the amounts.
+        """
+        assert self.merged is not None
+        index = MergeIndex()
+        last: Optional[Transactions] = None
+        for fin in self.merged:
+            self.fin = fin
+            self.trs = self.create_transactions()
+            self.parse_by_statement()
+            self.close()
+            trs = self.trs
+            if last is not None and trs.data.get('account_identification') != last.data.get('account_identification'):
+                raise ValidationError("The account ({}) of {} should be equal to the account ({}) of the files before".format(
+                    trs.data.get('account_identification'), fin.name, last.data.get('account_identification')),
+                    self.statement)
+
+            transactions = list(trs)
+            opening_balance = get_opening_balance(fin)
+            closing_balance = trs.data['final_closing_balance']
+            try:
+                duplicates = index.add(fin.name,
+                                       transactions,
+                                       None if opening_balance is None else opening_balance[1],
+                                       closing_balance.amount.amount,
+                                       closing_balance.date)
+            except AssertionError as e:
+                raise ValidationError(str(e), self.statement)
+            if last is None or closing_balance.date >= last.data['final_closing_balance'].date:
+                last = trs
+
+            for transaction, duplicate in zip(transactions, duplicates):
+                if duplicate:
+                    self.add_transaction(transaction, transaction.data['amount'].amount)
+                else:
+                    yield transaction
+
+        assert last is not None
+        self.trs = last
+        if index.nr_duplicates:
+            logger.info('Skipped %d transaction(s) repeated in the merged files', index.nr_duplicates)
+
+    def measure(self, phase: str) -> ContextManager[None]:
+        """Return a context manager measuring a phase when metrics are enabled
+        """
+        return nullcontext() if self.metrics is None else self.metrics.measure(phase)
+
+    def check_continuity(self, previous: Optional[Dict[str, Any]], data: Dict[str, Any]) -> None:
+        """Check that a statement opens with the closing balance of the
+        previous statement for the same account
+
+        Since the statements are parsed independently this shows whether
+        nothing got lost between them.
+        """
+        if previous is None or \
+           previous.get('account_identification') != data.get('account_identification'):
+            return
+
+        closing_balance = previous.get('final_closing_balance') or previous.get('intermediate_closing_balance')
+        opening_balance = data.get('final_opening_balance') or data.get('intermediate_opening_balance')
+        if closing_balance is None or opening_balance is None:
+            return
+
+        # Bank exports are not always contiguous so just warn
+        if opening_balance.amount != closing_balance.amount:
+            logger.warning("The opening balance (%s) of statement %s should be equal to the closing balance (%s) of the previous statement",
+                           opening_balance,
+                           data.get('statement_number'),
+                           closing_balance)
+
+    def pop_transactions(self, keep_last: bool) -> Iterator[Transaction]:
+        """Remove and return the parsed transactions
+        """
+        transactions = self.trs.transactions
+        count = len(transactions) - 1 if keep_last else len(transactions)
+        if count > 0:
+            done = transactions[:count]
+            del transactions[:count]
+            yield from done
+
+    def parse_record(self, transaction: Transaction) -> Optional[StatementLine]:
         """Parse given transaction line and return StatementLine object
         """
-        logger.debug('transaction:\n' + pformat(transaction, indent=4))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('transaction:\n%s', pformat(transaction, indent=4))
+        if self.trace is not None:
+            self.trace.add(self.cur_record, transaction)
         stmt_line = None
 
-        # Use str() to prevent rounding errors
-        bank_account_to = transaction.data.get('customer_reference')
-        amount = Decimal(str(transaction.data['amount'].amount))
-        memo = transaction.data['transaction_details']
-        memo = memo.replace("\n", '')
-        memo = memo.replace(transaction.data['customer_reference'], '', 1)
-        memo = memo.replace(transaction.data['extra_details'], '', 1).strip()
-        memo = memo if memo != '' else 'UNKNOWN'
-        payee = None
-        if transaction.data['customer_reference'] != ''\
-           and transaction.data['extra_details'] != '':
-            payee = "{1} ({0})".format(transaction.data['customer_reference'],
-                                       transaction.data['extra_details'])
+        # The amount is an exact Decimal, its text (number of decimals) is
+        # part of the transaction id, so it is only converted into an integer
+        # for the totals
+        amount = transaction.data['amount'].amount
+        memo, payee, bank_account_to = get_details(self.dialect,
+                                                   transaction.data['transaction_details'],
+                                                   transaction.data['customer_reference'],
+                                                   transaction.data['extra_details'])
 
         date = transaction.data['date']
 
+        self.add_transaction(transaction, amount)
+
         # Remove zero-value notifications
         if amount != 0:
             stmt_line = StatementLine(date=date,
                                       memo=memo,
                                       amount=amount)
             stmt_line.id = \
-                generate_unique_transaction_id(stmt_line, self.unique_id_set)
+                self.generate_unique_transaction_id(stmt_line, self.unique_id_set)
             m = re.match(r'([0-9a-f]+)(-\d+)?$', stmt_line.id)
             assert m, "Id should match hexadecimal digits, \
 optionally followed by a minus and a counter: '{}'".format(stmt_line.id)
@@ -143,38 +625,200 @@ optionally followed by a minus and a counter: '{}'".format(stmt_line.id)
                 # include counter so the memo gets unique
                 stmt_line.memo = stmt_line.memo + ' #' + str(counter + 1)
 
+            # Skip transactions exported before
+            if self.ledger is not None:
+                account_id = transaction.data.get('account_identification')
+                if self.ledger.contains(account_id, stmt_line.id):
+                    self.nr_skipped += 1
+                    return None
+                self.ledger.add(account_id, stmt_line.id, date)
+
             stmt_line.payee = payee
             if bank_account_to:
                 stmt_line.bank_account_to = \
                     BankAccount(bank_id=None,
                                 acct_id=bank_account_to)
+            self.totals.add(stmt_line, amount)
 
         return stmt_line
 
+    def add_transaction(self, transaction: Transaction, amount: Decimal) -> None:
+        """Add the amount of a transaction to its bank statement, also when
+        it gives no statement line
+        """
+        self.totals.add_transaction(amount)
+        if self.check_balances and 'statement_closing_balance' in transaction.data:
+            self.check_balance(transaction)
+
+    def check_balance(self, transaction: Transaction) -> None:
+        """Check the balance of the bank statement ending with this transaction
+
+        This makes a corrupt file fail as soon as possible.
+        """
+        opening_balance = transaction.data['statement_opening_balance']
+        closing_balance = transaction.data['statement_closing_balance']
+        try:
+            self.totals.check_balance(opening_balance.amount.amount, closing_balance.amount.amount)
+        except AssertionError as e:
+            raise ValidationError("Bank statement of {}: {}".format(closing_balance.date, e), self.statement)
+
+
+def parse_account(args: Tuple[str, str, str, bool, Optional[int], Optional[str], bool, str, bool, bool]) -> \
+        Tuple[Statement, List[Tuple[str, str, str]]]:
+    """Parse the MT940 data of one account, maybe in a worker process
+
+    Returns the statement without its trace and ledger, since these can
+    not be pickled, and the transaction ids to add to the ledger.
+    """
+    data, bank_code, bank_id, end_date_derived_from_statements, trace, ledger, check_balances, engine, compact, \
+        structured_details = args
+    parser = Parser(io.StringIO(data),
+                    bank_code,
+                    bank_id,
+                    end_date_derived_from_statements,
+                    trace=trace or 0,
+                    check_balances=check_balances,
+                    engine=engine,
+                    compact=compact,
+                    structured_details=structured_details)
+    if ledger is not None:
+        # the parser of the whole file holds the lock
+        parser.ledger = Ledger(ledger, lock=False)
+    statement = parser.parse()
+    statement.trace = None
+    pending: List[Tuple[str, str, str]] = []
+    if statement.ledger is not None:
+        pending = statement.ledger.pending
+        statement.ledger.close()
+        statement.ledger = None
+    return statement, pending
+
 
 class Plugin(BasePlugin):
     """MT940, text
     """
 
-    def get_file_object_parser(self, fh: IO[str]) -> Parser:
+    def get_file_object_parser(self, fh: Union[IO[str], MappedFile]) -> Parser:
         bank_code = 'ASN'
         bank_id = None
         end_date_derived_from_statements = False
+        streaming = False
+        workers = 1
+        trace = 0
+        metrics = False
+        metrics_file = None
+        ledger = None
+        cache_dir = None
+        cache_max_size = None
+        cache_max_age = None
+        check_balances = False
+        engine = 'mt940'
+        compact = False
+        structured_details = False
         if self.settings is None:
             pass
         else:
             if 'bank_code' in self.settings:
-                bank_code = self.settings.get('bank_code')
+                bank_code = self.settings['bank_code']
             if 'bank_id' in self.settings:
-                bank_id = self.settings.get('bank_id')
+                bank_id = self.settings['bank_id']
             if 'end_date_derived_from_statements' in self.settings:
-                end_date_derived_from_statements = (self.settings.get('end_date_derived_from_statements').lower() == 'true')
+                end_date_derived_from_statements = (self.settings['end_date_derived_from_statements'].lower() == 'true')
+            if 'streaming' in self.settings:
+                streaming = (self.settings['streaming'].lower() == 'true')
+            if 'workers' in self.settings:
+                workers = int(self.settings['workers'])
+            if 'trace' in self.settings:
+                trace = int(self.settings['trace'])
+            if 'metrics' in self.settings:
+                metrics = (self.settings['metrics'].lower() == 'true')
+            if 'metrics_file' in self.settings:
+                metrics_file = self.settings['metrics_file']
+            if 'ledger' in self.settings:
+                ledger = self.settings['ledger']
+            if 'cache_dir' in self.settings:
+                cache_dir = self.settings['cache_dir']
+            if 'cache_max_size' in self.settings:
+                cache_max_size = int(self.settings['cache_max_size'])
+            if 'cache_max_age' in self.settings:
+                cache_max_age = float(self.settings['cache_max_age'])
+            if 'check_balances' in self.settings:
+                check_balances = (self.settings['check_balances'].lower() == 'true')
+            if 'engine' in self.settings:
+                engine = self.settings['engine'].lower()
+            if 'compact' in self.settings:
+                compact = (self.settings['compact'].lower() == 'true')
+            if 'structured_details' in self.settings:
+                structured_details = (self.settings['structured_details'].lower() == 'true')
 
         if bank_id is None:
             bank_id = get_bank_id(bank_code)
 
-        parser = Parser(fh, bank_code, bank_id, end_date_derived_from_statements)
+        cache = None
+        if cache_dir and ledger:
+            # the result depends on the ledger, not only on the file
+            logger.warning('The cache is not used together with a ledger')
+        elif cache_dir:
+            cache = Cache(cache_dir, cache_max_size, cache_max_age)
+
+        parser = Parser(fh,
+                        bank_code,
+                        bank_id,
+                        end_date_derived_from_statements,
+                        streaming,
+                        workers,
+                        trace,
+                        metrics,
+                        metrics_file,
+                        ledger,
+                        cache,
+                        check_balances,
+                        engine,
+                        compact,
+                        structured_details)
         return parser
 
+    def get_input_encoding(self) -> str:
+        input_encoding: str = AUTO
+        if self.settings is not None and 'input_encoding' in self.settings:
+            input_encoding = self.settings['input_encoding'].lower()
+        return input_encoding
+
     def get_parser(self, filename: str) -> Parser:
-        return self.get_file_object_parser(open(filename, "r"))
+        # the file is opened while parsing and closed afterwards
+        parser = self.get_file_object_parser(MappedFile(filename, self.get_input_encoding()))
+        if parser.cache is not None:
+            parser.cache_key = parser.cache.get_key(filename, parser.get_cache_settings())
+        return parser
+
+    def get_merge_parser(self, filenames: Sequence[str]) -> Parser:
+        """Return a parser merging the files of one account into one
+        statement, see Parser.merge_records()
+
+        The files are parsed one at a time, so the streaming, workers and
+        cache settings are not used.
+        """
+        if not filenames:
+            raise ValueError("No files to merge")
+        input_encoding = self.get_input_encoding()
+        files = sort_files(MappedFile(filename, input_encoding) for filename in filenames)
+        parser = self.get_file_object_parser(files[0])
+        parser.merged = files
+        return parser
+
+
+def parse_text(data: str, settings: Optional[Dict[str, str]] = None) -> Statement:
+    """Parse MT940 data in memory with the plugin settings
+
+    Every call has its own parser, so this can be called from many threads
+    at once. Like Parser.parse() the statement is not validated yet.
+    """
+    return Plugin(UI(), settings or {}).get_file_object_parser(io.StringIO(data)).parse()
+
+
+def parse_bytes(data: bytes, settings: Optional[Dict[str, str]] = None) -> Statement:
+    """Parse MT940 data in memory decoded like a file, see parse_text() and
+    the input_encoding setting
+    """
+    plugin = Plugin(UI(), settings or {})
+    return plugin.get_file_object_parser(BytesFile(data, plugin.get_input_encoding())).parse()
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Optional, Sequence, Tuple, NamedTuple
+
+import argparse
+import glob
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from ofxstatement import configuration
+from ofxstatement.ofx import OfxWriter
+from ofxstatement.ui import UI
+
+from ofxstatement.plugins.mt940 import Plugin, Parser
+from ofxstatement.plugins.mt940_ofx import write_ofx
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ('.sta', '.txt')
+
+# One plugin per distinct settings per process
+_plugins: Dict[Tuple[Tuple[str, str], ...], Plugin] = {}
+_plugins_lock = threading.Lock()
+
+
+class ConversionResult(NamedTuple):
+    input_file: str
+    output_file: str
+    nr_lines: int
+    error: Optional[str]
+
+
+def get_plugin(settings: Dict[str, str]) -> Plugin:
+    """Return the plugin for these settings, shared by all conversions in
+    this process
+    """
+    key = tuple(sorted(settings.items()))
+    with _plugins_lock:
+        if key not in _plugins:
+            _plugins[key] = Plugin(UI(), settings)
+        return _plugins[key]
+
+
+def find_files(paths: Sequence[str]) -> List[str]:
+    """Return the MT940 files for directories and/or glob patterns
+
+    For a directory all files with a .sta or .txt extension are returned.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name)
+                         for name in sorted(os.listdir(path))
+                         if os.path.splitext(name)[1].lower() in EXTENSIONS)
+        else:
+            files.extend(sorted(glob.glob(path)))
+    return files
+
+
+def get_output_file(input_file: str, output_dir: Optional[str] = None, account: Optional[str] = None) -> str:
+    """Return the OFX file name for an input file, or for one of its
+    accounts
+    """
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    if account is not None:
+        name += '_' + re.sub(r'[^\w.-]', '_', account)
+    name += '.ofx'
+    return os.path.join(output_dir or os.path.dirname(input_file), name)
+
+
+def check_output_files(input_files: Sequence[str], output_files: Sequence[str]) -> None:
+    """Raise a ValueError when two input files would be converted into the
+    same OFX file, e.g. x.sta and x.txt
+    """
+    converted: Dict[str, str] = {}
+    for input_file, output_file in zip(input_files, output_files):
+        key = os.path.normcase(os.path.abspath(output_file))
+        if key in converted:
+            raise ValueError("Both {} and {} would be converted into {}".format(converted[key], input_file, output_file))
+        converted[key] = input_file
+
+
+def convert_file(input_file: str,
+                 output_file: str,
+                 settings: Dict[str, str],
+                 pretty: bool = False,
+                 stream: bool = False,
+                 accounts: bool = False) -> ConversionResult:
+    """Convert one MT940 file into an OFX file
+
+    When stream is true the transactions are written while parsing, see
+    write_ofx(). When accounts is true an OFX file is written per account,
+    see Parser.parse_accounts(), and the output file is used for their
+    names. Errors are returned in the result instead of raised.
+    """
+    encoding = settings.get('encoding', 'utf-8')
+    try:
+        plugin = get_plugin(settings)
+        if accounts:
+            return convert_accounts(plugin, input_file, output_file, pretty, encoding)
+        return write_statement(plugin.get_parser(input_file), input_file, output_file, pretty, stream, encoding)
+    except Exception as e:
+        return get_failure(input_file, output_file, e)
+
+
+def merge_files(input_files: Sequence[str],
+                output_file: str,
+                settings: Dict[str, str],
+                pretty: bool = False,
+                stream: bool = False) -> ConversionResult:
+    """Convert MT940 files of one account into one OFX file without the
+    transactions repeated by files whose periods overlap
+
+    See Plugin.get_merge_parser(). Errors are returned in the result
+    instead of raised.
+    """
+    input_file = ', '.join(input_files)
+    encoding = settings.get('encoding', 'utf-8')
+    try:
+        parser = get_plugin(settings).get_merge_parser(input_files)
+        return write_statement(parser, input_file, output_file, pretty, stream, encoding)
+    except Exception as e:
+        return get_failure(input_file, output_file, e)
+
+
+def write_statement(parser: Parser,
+                    input_file: str,
+                    output_file: str,
+                    pretty: bool,
+                    stream: bool,
+                    encoding: str) -> ConversionResult:
+    """Write the statement of a parser to an OFX file
+
+    Nothing is written when the statement is not valid. The transactions
+    are recorded in the ledger once the file is closed, and the ledger is
+    released when the conversion fails.
+    """
+    try:
+        if stream:
+            try:
+                with open(output_file, "w", encoding=encoding) as out:
+                    statement = write_ofx(parser, out, pretty=pretty, encoding=encoding)
+                statement.assert_valid()
+            except Exception:
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                raise
+            statement.commit()
+            assert statement.totals is not None
+            return ConversionResult(input_file, output_file, statement.totals.nr_lines, None)
+
+        statement = parser.parse()
+
+        # Generate the OFX before validating so the metrics include it
+        with parser.measure('ofx'):
+            ofx = OfxWriter(statement).toxml(pretty=pretty, encoding=encoding)
+        statement.assert_valid()
+
+        with open(output_file, "w", encoding=encoding) as out:
+            out.write(ofx)
+        statement.commit()
+        return ConversionResult(input_file, output_file, len(statement.lines), None)
+    finally:
+        if parser.ledger is not None:
+            parser.ledger.close()
+
+
+def get_failure(input_file: str, output_file: str, e: Exception) -> ConversionResult:
+    logger.debug('Conversion of %s failed', input_file, exc_info=True)
+    # ValidationError and ParseError have a message without the object
+    error = "{}: {}".format(type(e).__name__, getattr(e, 'message', e))
+    return ConversionResult(input_file, output_file, 0, error)
+
+
+def convert_accounts(plugin: Plugin,
+                     input_file: str,
+                     output_file: str,
+                     pretty: bool,
+                     encoding: str) -> ConversionResult:
+    """Convert one MT940 file into an OFX file per account
+
+    Nothing is written when the statement of an account is not valid. The
+    transactions of all accounts are recorded in their ledger once every
+    file has been written.
+    """
+    parser = plugin.get_parser(input_file)
+    try:
+        statements = parser.parse_accounts()
+        output: List[Tuple[str, str, int]] = []
+        for statement in statements:
+            ofx = OfxWriter(statement).toxml(pretty=pretty, encoding=encoding)
+            statement.assert_valid()
+            output.append((get_output_file(output_file, os.path.dirname(output_file), statement.account_id),
+                           ofx,
+                           len(statement.lines)))
+
+        for filename, ofx, _ in output:
+            with open(filename, "w", encoding=encoding) as out:
+                out.write(ofx)
+        for statement in statements:
+            statement.commit()
+    finally:
+        if parser.ledger is not None:
+            parser.ledger.close()
+    return ConversionResult(input_file,
+                            ', '.join(filename for filename, _, _ in output),
+                            sum(nr_lines for _, _, nr_lines in output),
+                            None)
+
+
+def convert_files(files: Sequence[str],
+                  settings: Dict[str, str],
+                  output_dir: Optional[str] = None,
+                  jobs: Optional[int] = None,
+                  processes: bool = False,
+                  pretty: bool = False,
+                  stream: bool = False,
+                  accounts: bool = False) -> List[ConversionResult]:
+    """Convert MT940 files into OFX files using a pool of threads or
+    processes
+
+    The results are returned in the order of the files. Nothing is converted
+    when two files would be converted into the same OFX file, see
+    check_output_files().
+    """
+    output_files = [get_output_file(input_file, output_dir) for input_file in files]
+    check_output_files(files, output_files)
+    executor: Executor = \
+        ProcessPoolExecutor(max_workers=jobs) if processes else ThreadPoolExecutor(max_workers=jobs)
+    with executor:
+        futures = [executor.submit(convert_file,
+                                   input_file,
+                                   output_file,
+                                   settings,
+                                   pretty,
+                                   stream,
+                                   accounts)
+                   for input_file, output_file in zip(files, output_files)]
+        return [future.result() for future in futures]
+
+
+def get_settings(config_file: Optional[str], section: Optional[str]) -> Dict[str, str]:
+    """Return the plugin settings from the ofxstatement configuration
+    """
+    if section is None:
+        return {}
+
+    config = configuration.read(config_file)
+    if config is None or section not in config:
+        raise ValueError("No section '{}' in config file".format(section))
+    return dict(config[section])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Console entry point
+    """
+    parser = argparse.ArgumentParser(description="Convert MT940 files to OFX files.")
+    parser.add_argument("-c", "--config", help="ofxstatement configuration file")
+    parser.add_argument("-t", "--type", help="configuration section to use (default: no configuration)")
+    parser.add_argument("-o", "--output-dir", help="directory for the OFX files (default: next to the input)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of files converted at the same time")
+    parser.add_argument("--processes", action="store_true", help="use processes instead of threads")
+    parser.add_argument("--pretty", action="store_true", help="pretty print the OFX output")
+    parser.add_argument("--stream", action="store_true",
+                        help="write the transactions while parsing to save memory on large files")
+    parser.add_argument("--accounts", action="store_true",
+                        help="write an OFX file per account (tag 25) named after the input file and the account")
+    parser.add_argument("--merge", metavar="OUTPUT_FILE",
+                        help="merge the files of one account into one OFX file without the transactions they repeat")
+    parser.add_argument("paths", nargs="+", help="directories and/or glob patterns of MT940 files")
+    args = parser.parse_args(argv)
+    if args.stream and args.accounts:
+        parser.error("--stream can not be combined with --accounts")
+    if args.merge and args.accounts:
+        parser.error("--merge can not be combined with --accounts")
+
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+    try:
+        settings = get_settings(args.config, args.type)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.merge:
+        output_file = os.path.join(args.output_dir or '', args.merge)
+        results = [merge_files(find_files(args.paths), output_file, settings, pretty=args.pretty, stream=args.stream)]
+    else:
+        try:
+            results = convert_files(find_files(args.paths),
+                                    settings,
+                                    output_dir=args.output_dir,
+                                    jobs=args.jobs,
+                                    processes=args.processes,
+                                    pretty=args.pretty,
+                                    stream=args.stream,
+                                    accounts=args.accounts)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+
+    failures = [result for result in results if result.error]
+    for result in failures:
+        logger.error("%s: %s", result.input_file, result.error)
+    logger.info("Conversion completed: %d file(s) converted, %d file(s) failed, %d line(s)",
+                len(results) - len(failures),
+                len(failures),
+                sum(result.nr_lines for result in results))
+
+    return 2 if failures else 0
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, Optional, Sequence, cast
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+from decimal import Decimal
+
+from mt940.models import Date
+
+from ofxstatement.statement import StatementLine, BankAccount
+
+from ofxstatement.plugins.statement import Statement
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.json.z'
+
+
+def dump_statement(stmt: Statement) -> bytes:
+    """Return a statement as compressed JSON
+    """
+    def to_str(value: Any) -> Optional[str]:
+        return None if value is None else str(value)
+
+    data = {'bank_id': stmt.bank_id,
+            'account_id': stmt.account_id,
+            'account_type': stmt.account_type,
+            'currency': stmt.currency,
+            'start_balance': to_str(stmt.start_balance),
+            'start_date': to_str(stmt.start_date),
+            'end_balance': to_str(stmt.end_balance),
+            'end_date': to_str(stmt.end_date),
+            'lines': [[sl.id,
+                       to_str(sl.date),
+                       sl.memo,
+                       to_str(sl.amount),
+                       sl.payee,
+                       sl.bank_account_to.acct_id if sl.bank_account_to else None]
+                      for sl in stmt.lines]}
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def load_statement(blob: bytes) -> Statement:
+    """Return the statement dumped by dump_statement()
+    """
+    def to_date(value: Optional[str]) -> Optional[Date]:
+        # the same date type as the parser's
+        return None if value is None else Date.fromisoformat(value)
+
+    def to_decimal(value: Optional[str]) -> Optional[Decimal]:
+        return None if value is None else Decimal(value)
+
+    data: Dict[str, Any] = json.loads(zlib.decompress(blob).decode('utf-8'))
+    stmt = Statement(bank_id=data['bank_id'],
+                     account_id=data['account_id'],
+                     currency=data['currency'],
+                     account_type=data['account_type'])
+    stmt.start_balance = to_decimal(data['start_balance'])
+    stmt.start_date = to_date(data['start_date'])
+    stmt.end_balance = to_decimal(data['end_balance'])
+    stmt.end_date = to_date(data['end_date'])
+    for id, date, memo, amount, payee, bank_account_to in data['lines']:
+        # like the parser the line gets a date, not the datetime it is annotated with
+        stmt_line = StatementLine(id=id, date=cast(Optional[datetime.datetime], to_date(date)), memo=memo,
+                                  amount=to_decimal(amount))
+        stmt_line.payee = payee
+        if bank_account_to:
+            stmt_line.bank_account_to = BankAccount(bank_id=None, acct_id=bank_account_to)  # type: ignore
+        stmt.lines.append(stmt_line)
+    return stmt
+
+
+class Cache:
+    """Parsed statements keyed on the contents of the file and the settings
+
+    The least recently used statements are evicted when the cache gets
+    larger than max_size bytes and statements are evicted when older than
+    max_age days.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 max_size: Optional[int] = None,
+                 max_age: Optional[float] = None) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return "<{}> {}".format(type(self).__name__, self.directory)
+
+    def get_key(self, filename: str, settings: Sequence[Any]) -> str:
+        """Return the hash of the file contents and the settings
+        """
+        h = hashlib.sha256(repr(tuple(settings)).encode('utf-8'))
+        with open(filename, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get_filename(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key: str) -> Optional[Statement]:
+        filename = self.get_filename(key)
+        try:
+            with open(filename, "rb") as fh:
+                stmt = load_statement(fh.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning('Ignoring corrupt cache file %s', filename, exc_info=True)
+            return None
+
+        # the modification time is used to evict the least recently used
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            # evicted by another conversion meanwhile
+            pass
+        logger.debug('Statement found in cache file %s', filename)
+        return stmt
+
+    def put(self, key: str, stmt: Statement) -> None:
+        # write atomically since other conversions may read it
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(dump_statement(stmt))
+        os.replace(tmp, self.get_filename(key))
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        now = time.time()
+        total_size = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            too_old = self.max_age is not None and now - mtime > self.max_age * 86400
+            too_large = self.max_size is not None and total_size > self.max_size
+            if not (too_old or too_large):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union, overload
+
+import datetime
+import re
+from array import array
+from decimal import Decimal
+
+from ofxstatement.statement import StatementLine, BankAccount
+
+from ofxstatement.plugins.statement import to_cents, from_cents
+
+# a generated transaction id: a SHA1 hex digest and maybe a counter
+ID_RE = re.compile(r'([0-9a-f]{40})(-\d+)?$')
+
+# the attributes stored in columns, see dump_statement() too
+COLUMNS = ('id', 'date', 'memo', 'amount', 'payee', 'bank_account_to')
+
+DEFAULTS = vars(StatementLine())
+
+
+class StringColumn:
+    """Strings stored as indexes into a table of distinct strings
+    """
+
+    def __init__(self) -> None:
+        self.strings: List[Optional[str]] = [None]
+        self.index: Dict[Optional[str], int] = {None: 0}
+        self.values = array('I')
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.strings[self.values[i]]
+
+    def append(self, value: Optional[str]) -> None:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        self.values.append(i)
+
+
+class TextColumn:
+    """Strings stored as UTF-8 one after the other
+    """
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def append(self, value: str) -> None:
+        self.data += value.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+
+class LineColumns(Sequence[StatementLine]):
+    """Statement lines stored in columns
+
+    A statement line takes a few dozen bytes plus its memo instead of a
+    StatementLine with a BankAccount, a Decimal and strings. The
+    StatementLine objects are created again when the lines are used, so
+    changing one does not change the stored line. Attributes without a
+    column are kept per line when they are not the default.
+    """
+
+    def __init__(self, lines: Iterable[StatementLine] = ()) -> None:
+        self.dates = array('I')
+        self.cents = array('q')
+        self.exponents = array('b')
+        self.ids = bytearray()
+        self.id_counters: Dict[int, str] = {}
+        self.memos = TextColumn()
+        self.payees = StringColumn()
+        self.accounts = StringColumn()
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        for stmt_line in lines:
+            self.append(stmt_line)
+
+    def __repr__(self) -> str:
+        return "<{}> {} line(s)".format(type(self).__name__, len(self))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def append(self, stmt_line: StatementLine) -> None:
+        i = len(self)
+        extra: Dict[str, Any] = {}
+
+        m = ID_RE.match(stmt_line.id or '')
+        if m is None:
+            extra['id'] = stmt_line.id
+            self.ids += bytes(20)
+        else:
+            self.ids += bytes.fromhex(m.group(1))
+            if m.group(2):
+                self.id_counters[i] = m.group(2)
+
+        date = stmt_line.date
+        if isinstance(date, datetime.date) and not isinstance(date, datetime.datetime):
+            self.dates.append(date.toordinal())
+        else:
+            extra['date'] = date
+            self.dates.append(0)
+
+        amount = stmt_line.amount
+        exponent = amount.as_tuple().exponent if isinstance(amount, Decimal) else None
+        if isinstance(exponent, int) and -2 <= exponent <= 0:
+            self.cents.append(to_cents(amount))
+            self.exponents.append(exponent)
+        else:
+            extra['amount'] = amount
+            self.cents.append(0)
+            self.exponents.append(0)
+
+        if stmt_line.memo is None:
+            extra['memo'] = None
+        self.memos.append(stmt_line.memo or '')
+        self.payees.append(stmt_line.payee)
+
+        account = stmt_line.bank_account_to
+        if account is None or vars(account) == vars(BankAccount(None, account.acct_id)):  # type: ignore
+            self.accounts.append(None if account is None else account.acct_id)
+        else:
+            extra['bank_account_to'] = account
+            self.accounts.append(None)
+
+        for name, value in vars(stmt_line).items():
+            if name not in COLUMNS and value != DEFAULTS.get(name, getattr(StatementLine, name, None)):
+                extra[name] = value
+        if extra:
+            self.extras[i] = extra
+
+    def get(self, i: int) -> StatementLine:
+        """Return a new StatementLine for a line
+        """
+        counter = self.id_counters.get(i, '')
+        amount = from_cents(self.cents[i])
+        exponent = self.exponents[i]
+        if exponent != -2:
+            amount = amount.quantize(Decimal(1).scaleb(exponent))
+        stmt_line = StatementLine(id=self.ids[20 * i:20 * (i + 1)].hex() + counter,
+                                  date=datetime.date.fromordinal(self.dates[i]) if self.dates[i] else None,  # type: ignore
+                                  memo=self.memos[i],
+                                  amount=amount)
+        stmt_line.payee = self.payees[i]
+        account = self.accounts[i]
+        if account is not None:
+            stmt_line.bank_account_to = BankAccount(bank_id=None, acct_id=account)  # type: ignore
+        extra = self.extras.get(i)
+        if extra:
+            for name, value in extra.items():
+                setattr(stmt_line, name, value)
+        return stmt_line
+
+    @overload
+    def __getitem__(self, i: int) -> StatementLine:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[StatementLine]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[StatementLine, List[StatementLine]]:
+        if isinstance(i, slice):
+            return [self.get(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('line index out of range')
+        return self.get(i)
+
+    def __iter__(self) -> Iterator[StatementLine]:
+        for i in range(len(self)):
+            yield self.get(i)
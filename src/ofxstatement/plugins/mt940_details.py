@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Memo, payee and counter account from the transaction details (tag 86)
+
+The plain memo is the transaction details without the counter account and
+its name, as always. The structured dialects read the subfields banks put
+in the details instead. Since recurring transactions repeat the same
+details, the result is cached per distinct text.
+"""
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import functools
+import re
+
+# number of distinct transaction details cached
+CACHE_SIZE = 1 << 16
+
+# SEPA subfields like /NAME/, see the MT940 formats of ING, ABN AMRO or Rabobank
+SLASH_CODES = ('TRTP', 'EREF', 'CNTP', 'NAME', 'REMI', 'IBAN', 'BIC', 'ADDR', 'MARF', 'CSID', 'ORDP', 'BENM',
+               'SVCL', 'ULTC', 'ULTD', 'ULTB', 'PURP', 'RTRN', 'ISDT', 'PREF', 'FX')
+SLASH_RE = re.compile(r'/({})/'.format('|'.join(SLASH_CODES)))
+
+# German GVC subfields like ?20 or >20 (Triodos)
+GVC_RE = re.compile(r'^\d{3}([>?])\d{2}')
+
+# Knab: the counter account and its name on the last line
+KNAB_RE = re.compile(r'\nREK: ([^/\n]*)/NAAM: ([^\n]*)$')
+
+
+class Details(NamedTuple):
+    memo: str
+    payee: Optional[str]
+    account: Optional[str]
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def get_payee(name: Optional[str], account: Optional[str]) -> Optional[str]:
+    if name and account:
+        return "{} ({})".format(name, account)
+    return name or None
+
+
+def plain_details(details: str, customer_reference: str, extra_details: str) -> Details:
+    """The details without the counter account and its name
+    """
+    memo = details.replace("\n", '')
+    memo = memo.replace(customer_reference, '', 1)
+    memo = memo.replace(extra_details, '', 1).strip()
+    payee = None
+    if customer_reference != '' and extra_details != '':
+        payee = "{1} ({0})".format(customer_reference, extra_details)
+    return Details(memo if memo != '' else 'UNKNOWN', payee, customer_reference or None)
+
+
+def slash_fields(details: str) -> Optional[Dict[str, str]]:
+    """Return the SEPA subfields, e.g.
+    /EREF/NOTPROVIDED//CNTP/NL55INGB0000000000/INGBNL2A/J. Doe///REMI/USTD//Rent/
+    """
+    text = details.replace('\n', '').strip()
+    matches = list(SLASH_RE.finditer(text))
+    if not matches or matches[0].start() != 0:
+        return None
+    fields: Dict[str, str] = {}
+    for m, end in zip(matches, [m.start() for m in matches[1:]] + [len(text)]):
+        fields.setdefault(m.group(1), text[m.end():end].rstrip('/'))
+    return fields
+
+
+def slash_details(details: str, customer_reference: str) -> Optional[Details]:
+    fields = slash_fields(details)
+    if fields is None:
+        return None
+
+    name = fields.get('NAME')
+    account = fields.get('IBAN')
+    if 'CNTP' in fields:
+        # account/BIC/name/city
+        parts = fields['CNTP'].split('/')
+        account = account or parts[0]
+        if len(parts) > 2:
+            name = name or parts[2]
+
+    memo = fields.get('REMI', '')
+    if memo.startswith('USTD//'):
+        memo = memo[len('USTD//'):]
+    elif memo.startswith('STRD/'):
+        # a structured reference, e.g. STRD/CUR/123456789
+        memo = memo.rsplit('/', 1)[-1]
+    memo = normalize(memo) or normalize(fields.get('EREF', '')) or 'UNKNOWN'
+    account = normalize(account or '') or customer_reference or None
+    return Details(memo, get_payee(normalize(name or ''), account), account)
+
+
+def gvc_details(details: str, customer_reference: str) -> Optional[Details]:
+    """Return the details from GVC subfields, e.g.
+    000>100987654321>20MEMO>21MORE MEMO>310390123456>32NAME
+    """
+    text = details.replace('\n', '')
+    m = GVC_RE.match(text)
+    if m is None:
+        return None
+
+    fields: Dict[int, str] = {}
+    for field in text.split(m.group(1))[1:]:
+        if field[:2].isdigit():
+            fields[int(field[:2])] = field[2:]
+    memo = normalize(''.join(fields.get(i, '') for i in list(range(20, 30)) + list(range(60, 64))))
+    name = normalize(fields.get(32, '') + fields.get(33, ''))
+    account = normalize(fields.get(31, '')) or customer_reference or None
+    return Details(memo or 'UNKNOWN', get_payee(name, account), account)
+
+
+def knab_details(details: str, customer_reference: str) -> Optional[Details]:
+    m = KNAB_RE.search(details)
+    if m is None:
+        return None
+
+    memo = normalize(details[:m.start()].replace('\n', ' '))
+    account = normalize(m.group(1)) or customer_reference or None
+    return Details(memo or 'UNKNOWN', get_payee(normalize(m.group(2)), account), account)
+
+
+# the structured formats tried per bank code before the plain memo
+DIALECTS: Dict[str, Tuple[Callable[[str, str], Optional[Details]], ...]] = {
+    'ASN': (slash_details,),
+    'ABNAMRO': (slash_details,),
+    'ING': (slash_details,),
+    'KNAB': (slash_details, knab_details),
+    'MBANK': (),
+    'RABO': (slash_details,),
+    'SNS': (slash_details,),
+    'TRIODOS': (gvc_details, slash_details),
+}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def get_details(dialect: Optional[str], details: str, customer_reference: str, extra_details: str) -> Details:
+    """Return the memo, payee and counter account of a transaction
+
+    Without a dialect, or when the details are not structured, the plain
+    memo is returned.
+    """
+    if dialect is not None:
+        for parse in DIALECTS.get(dialect, ()):
+            result = parse(details, customer_reference)
+            if result is not None:
+                return result
+    return plain_details(details, customer_reference, extra_details)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Iterator, Optional
+
+import codecs
+import mmap
+import re
+
+BOM = codecs.BOM_UTF8
+
+# see STATEMENT_START_RE in mt940.py, the first may follow a byte order mark
+STATEMENT_START_RE = re.compile(b'^(?:' + re.escape(BOM) + b')?:20:', re.MULTILINE)
+
+AUTO = 'auto'
+
+
+def decode_line(line: bytes) -> str:
+    try:
+        return line.decode('utf-8')
+    except UnicodeDecodeError:
+        return line.decode('latin-1')
+
+
+def decode(data: bytes, encoding: str) -> str:
+    """Return the text with universal newlines like a file opened in text
+    mode
+
+    The automatic encoding is UTF-8, which includes the SWIFT character
+    set, falling back to Latin-1 for anything else since banks mix them.
+    The fallback is per line, so the text is the same whether a file is
+    decoded line by line or statement by statement.
+
+    >>> decode('café\\n'.encode('utf-8') + 'café\\n'.encode('latin-1'), AUTO)
+    'café\\ncafé\\n'
+    """
+    if encoding == AUTO:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = ''.join(decode_line(line) for line in data.splitlines(keepends=True))
+    else:
+        text = data.decode(encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+class MappedFile:
+    """MT940 file read through a memory map
+
+    The file is only opened while iterating, so a parser that is never
+    used does not keep it open. The statements are found on the bytes and
+    decoded one at a time, so the file is never decoded and copied as a
+    whole.
+    """
+
+    map: Optional[mmap.mmap]
+
+    def __init__(self, name: str, encoding: str = AUTO) -> None:
+        if encoding != AUTO:
+            codecs.lookup(encoding)
+        self.name = name
+        self.encoding = encoding
+        self.file: Optional[Any] = None
+        self.map = None
+
+    def __repr__(self) -> str:
+        return "<{}> {} ({})".format(type(self).__name__, self.name, self.encoding)
+
+    def __enter__(self) -> 'MappedFile':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def open(self) -> Any:
+        """Return the memory map of the file, or empty bytes for an empty
+        file that can not be mapped
+        """
+        if self.file is None:
+            self.file = open(self.name, "rb")
+        if self.map is None:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return b''
+        return self.map
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def start(self, data: Any) -> int:
+        """Return the offset after a byte order mark
+        """
+        return len(BOM) if self.encoding in (AUTO, 'utf-8') and data[:len(BOM)] == BOM else 0
+
+    def statements(self) -> Iterator[str]:
+        """Return the text of every statement, see split_statements()
+        """
+        try:
+            data = self.open()
+            begin = self.start(data)
+            # anything before the second statement belongs to the first,
+            # search() since finditer() keeps the map busy till it is done
+            m = STATEMENT_START_RE.search(data)
+            m = m and STATEMENT_START_RE.search(data, m.end())
+            while m is not None:
+                yield decode(data[begin:m.start()], self.encoding)
+                begin = m.start()
+                m = STATEMENT_START_RE.search(data, m.end())
+            if begin < len(data):
+                yield decode(data[begin:], self.encoding)
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[str]:
+        """Return the lines like a file opened in text mode
+        """
+        try:
+            data = self.open()
+            begin = self.start(data)
+            while begin < len(data):
+                end = data.find(b'\n', begin) + 1 or len(data)
+                yield decode(data[begin:end], self.encoding)
+                begin = end
+        finally:
+            self.close()
+
+    def read(self) -> str:
+        return ''.join(self.statements())
+
+
+class BytesFile(MappedFile):
+    """MT940 data in memory read like a MappedFile, i.e. decoded statement
+    by statement or line by line
+    """
+
+    def __init__(self, data: bytes, encoding: str = AUTO, name: str = '<bytes>') -> None:
+        super().__init__(name, encoding)
+        self.data = data
+
+    def open(self) -> Any:
+        return self.data
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from typing import List, Optional, Tuple
+
+import datetime
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# seconds to wait for another conversion using the ledger
+TIMEOUT = 600
+
+
+class Ledger:
+    """Transaction ids per account exported in earlier runs
+
+    New transaction ids are kept apart till commit() is called, i.e. when the
+    statement has been validated and written.
+
+    The ledger is locked from the first lookup till commit(), release() or
+    close(), so conversions using the same ledger at the same time, in other
+    threads or processes, run one after the other and do not export the same
+    transactions. With lock false the lookups rely on a lock held by another
+    Ledger, e.g. in the worker processes of Parser.parse_accounts().
+    """
+
+    pending: List[Tuple[str, str, str]]
+
+    def __init__(self, filename: str, lock: bool = True) -> None:
+        self.filename = filename
+        # transactions are begun and ended explicitly
+        self.connection = sqlite3.connect(filename, timeout=TIMEOUT, isolation_level=None)
+        self.connection.execute("""\
+create table if not exists transactions
+( account_id text not null
+, id text not null
+, date text not null
+, exported text not null
+, primary key (account_id, id)
+) without rowid""")
+        self.pending = []
+        self.lock = lock
+        self.locked = False
+
+    def __repr__(self) -> str:
+        return "<{}> {}".format(type(self).__name__, self.filename)
+
+    def acquire(self) -> None:
+        """Lock the ledger for writing, waiting for other conversions
+        """
+        if self.lock and not self.locked:
+            self.connection.execute("begin immediate")
+            self.locked = True
+
+    def contains(self, account_id: Optional[str], id: str) -> bool:
+        self.acquire()
+        cursor = self.connection.execute("select 1 from transactions where account_id = ? and id = ?",
+                                         (account_id or '', id))
+        return cursor.fetchone() is not None
+
+    def add(self, account_id: Optional[str], id: str, date: datetime.date) -> None:
+        self.pending.append((account_id or '', id, date.isoformat()))
+
+    def commit(self) -> None:
+        """Store the new transaction ids and release the lock
+        """
+        if not self.pending and not self.locked:
+            return
+        exported = datetime.datetime.now().isoformat()
+        self.acquire()
+        self.connection.executemany("insert or ignore into transactions values (?, ?, ?, ?)",
+                                    [row + (exported,) for row in self.pending])
+        if self.locked:
+            self.connection.execute("commit")
+            self.locked = False
+        logger.debug('Added %d transaction(s) to ledger %s', len(self.pending), self.filename)
+        self.pending = []
+
+    def release(self) -> None:
+        """Forget the new transaction ids and release the lock
+        """
+        if self.locked:
+            self.connection.execute("rollback")
+            self.locked = False
+        self.pending = []
+
+    def close(self) -> None:
+        self.release()
+        self.connection.close()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Merging MT940 files of one account whose periods overlap
+
+Banks deliver the same bank statements again, e.g. a monthly file after
+the daily ones. The files are merged in the order of their first opening
+balance and a transaction is dropped when the files before had it already.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import datetime
+import re
+from decimal import Decimal
+
+from mt940.models import Transaction
+
+from ofxstatement.plugins.mt940_input import MappedFile
+
+# the first opening balance (tag 60F or 60M) with its date (YYMMDD)
+OPENING_BALANCE_RE = re.compile(r'^:60[FM]:([CD])(\d{6})[A-Z]{3}(\d+,\d*)', re.MULTILINE)
+
+# date, amount and transaction details (tag 86)
+Key = Tuple[datetime.date, Decimal, str]
+
+
+def get_opening_balance(fin: MappedFile) -> Optional[Tuple[str, Decimal]]:
+    """Return the date (YYMMDD) and the amount of the first opening
+    balance of a file, if any
+
+    Only the first statement is read.
+    """
+    statements = fin.statements()
+    try:
+        m = OPENING_BALANCE_RE.search(next(statements, ''))
+    finally:
+        statements.close()
+    if m is None:
+        return None
+    amount = Decimal(m.group(3).replace(',', '.'))
+    return m.group(2), -amount if m.group(1) == 'D' else amount
+
+
+def sort_files(files: Iterable[MappedFile]) -> List[MappedFile]:
+    """Return the files in the order of their first opening balance
+    """
+    def get_date(fin: MappedFile) -> str:
+        opening_balance = get_opening_balance(fin)
+        return '' if opening_balance is None else opening_balance[0]
+
+    return sorted(files, key=lambda fin: (get_date(fin), fin.name))
+
+
+def get_key(transaction: Transaction) -> Key:
+    return (transaction.data['date'],
+            transaction.data['amount'].amount,
+            transaction.data['transaction_details'])
+
+
+class MergeIndex:
+    """Index of the merged transactions by date, amount and transaction
+    details (tag 86)
+
+    A transaction of a file is a duplicate when the files before had as
+    many of them on that date, so a file repeating a period costs a lookup
+    per transaction. The balance before every merged transaction is kept
+    too, so each file is checked to open with the balance before the first
+    transaction it repeats, or with the closing balance of the file ending
+    last when it repeats nothing.
+    """
+
+    balances: Dict[Key, List[Decimal]]
+    balance: Optional[Decimal]
+    date: Optional[datetime.date]
+
+    def __init__(self) -> None:
+        self.balances = {}
+        # the closing balance of the file ending last and its date
+        self.balance = None
+        self.date = None
+        self.nr_duplicates = 0
+
+    def __repr__(self) -> str:
+        return "<{}> {} transaction(s), {} duplicate(s)".format(
+            type(self).__name__, sum(len(balances) for balances in self.balances.values()), self.nr_duplicates)
+
+    def add(self,
+            name: str,
+            transactions: Sequence[Transaction],
+            opening_balance: Optional[Decimal],
+            closing_balance: Decimal,
+            date: datetime.date) -> List[bool]:
+        """Add the transactions of a file with its balances and the date of
+        its closing balance
+
+        Returns whether every transaction is a duplicate. Without an opening
+        balance it is derived from the closing balance.
+        """
+        keys = [get_key(transaction) for transaction in transactions]
+        if opening_balance is None:
+            opening_balance = closing_balance - sum(key[1] for key in keys)
+        if self.balance is not None and keys:
+            first = self.balances.get(keys[0])
+            expected = first[0] if first else self.balance
+            assert opening_balance == expected, \
+                "The opening balance ({0}) of {1} should be equal to the balance ({2}) of the files before".format(
+                    opening_balance, name, expected)
+
+        balance = opening_balance
+        counts: Dict[Key, int] = {}
+        duplicates = []
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+            balances = self.balances.setdefault(key, [])
+            duplicate = counts[key] <= len(balances)
+            if not duplicate:
+                balances.append(balance)
+            balance += key[1]
+            duplicates.append(duplicate)
+        self.nr_duplicates += sum(duplicates)
+
+        if self.date is None or date >= self.date:
+            self.balance = closing_balance
+            self.date = date
+        return duplicates
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+import contextlib
+import datetime
+import functools
+import json
+import time
+
+T = TypeVar('T')
+
+
+class Metrics:
+    """Wall time and number of calls per phase of a conversion
+    """
+
+    phases: Dict[str, List[Any]]
+
+    def __init__(self, filename: Optional[str] = None, name: Optional[str] = None) -> None:
+        self.filename = filename
+        self.name = name
+        self.phases = {}
+        self.nr_transactions = 0
+
+    def __repr__(self) -> str:
+        return "<{}> {}".format(type(self).__name__, self.as_dict())
+
+    def add(self, phase: str, seconds: float, calls: int = 1) -> None:
+        totals = self.phases.setdefault(phase, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += calls
+
+    @contextlib.contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def wrap(self, phase: str, func: Callable[..., T]) -> Callable[..., T]:
+        """Return func measuring every call
+        """
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    def iterate(self, phase: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Return the items measuring the time to get each one
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(phase, time.perf_counter() - start)
+            yield item
+
+    def as_dict(self) -> Dict[str, Any]:
+        seconds = self.phases['parse'][0] if 'parse' in self.phases else None
+        return {'name': self.name,
+                'transactions': self.nr_transactions,
+                'seconds': seconds,
+                'transactions_per_second': self.nr_transactions / seconds if seconds else None,
+                'phases': {phase: {'seconds': totals[0], 'calls': totals[1]}
+                           for phase, totals in self.phases.items()}}
+
+    def write(self) -> None:
+        """Append the metrics as a JSON line to the metrics file (if any)
+        """
+        if self.filename is None:
+            return
+        line = dict(self.as_dict(), timestamp=datetime.datetime.now().isoformat())
+        with open(self.filename, "a") as fh:
+            fh.write(json.dumps(line) + '\n')
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Native MT940 engine
+
+A single pass tokenizer for the tags used by the supported banks that
+fills a mt940.models.Transactions object just like its parse() method, but
+without the generic tag handling. Anything else raises Unsupported, so the
+caller can fall back to the mt940 library.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import re
+
+from mt940 import tags
+from mt940.models import Amount, Balance, Date, Transaction, Transactions
+
+# a tag at the start of a line, see mt940.models.Transactions.parse()
+TAG_RE = re.compile(r':(?P<tag>[0-9]{2}|NS)(?P<sub_tag>[A-Z])?:')
+
+STATEMENT_NUMBER_RE = re.compile(r'(?P<statement_number>\d{1,5})(?:/?(?P<sequence_number>\d{1,5}))?$')
+
+BALANCE_RE = re.compile(r'(?P<status>[DC])(?P<year>\d{2})(?P<month>\d{2})(?P<day>\d{2})(?P<currency>.{3})(?P<amount>[0-9,]{0,16})',
+                        re.IGNORECASE)
+
+STATEMENT_RE = re.compile(r'(?P<year>\d{2})(?P<month>\d{2})(?P<day>\d{2})'
+                          r'(?P<entry_month>\d{2}|\s{2})?(?P<entry_day>\d{2}|\s{2})?'
+                          r'(?P<status>R?[DC])(?P<funds_code>[A-Z])?[\n ]?(?P<amount>[\d,]{1,15})'
+                          r'(?P<id>[A-Z][A-Z0-9 ]{3})?'
+                          r'(?P<customer_reference>((?!//)[^\n]){0,16})'
+                          r'(//(?P<bank_reference>.{0,23}))?'
+                          r'(\n?(?P<extra_details>.*))?$',
+                          re.IGNORECASE)
+
+STATEMENT_ASNB_RE = re.compile(r'(?P<year>\d{2})(?P<month>\d{2})(?P<day>\d{2})'
+                               r'(?P<entry_month>\d{2}|\s{2})?(?P<entry_day>\d{2}|\s{2})?'
+                               r'(?P<status>[A-Z]?[DC])(?P<funds_code>[A-Z])?\n?(?P<amount>[\d,]{1,15})'
+                               r'(?P<id>[A-Z][A-Z0-9 ]{3})?'
+                               r'(?P<customer_reference>.{0,34})'
+                               r'(//(?P<bank_reference>.{0,16}))?'
+                               r'(\n?(?P<extra_details>.{0,34}))?$',
+                               re.IGNORECASE)
+
+# what mt940 5.0.0 kept of transaction details
+DETAILS_RE = re.compile(r'(?:[\s\S]{0,65}\r?\n?){0,8}[\s\S]{0,65}')
+
+# tags with a single field: its name and maximum length
+REFERENCE_TAGS = {tags.TransactionReferenceNumber: ('transaction_reference', 16),
+                  tags.RelatedReference: ('related_reference', 16),
+                  tags.AccountIdentification: ('account_identification', 35)}
+
+BALANCE_TAGS = {tags.OpeningBalance,
+                tags.FinalOpeningBalance,
+                tags.IntermediateOpeningBalance,
+                tags.ClosingBalance,
+                tags.IntermediateClosingBalance,
+                tags.FinalClosingBalance,
+                tags.AvailableBalance,
+                tags.ForwardAvailableBalance}
+
+STATEMENT_TAGS = {tags.Statement: STATEMENT_RE,
+                  tags.StatementASNB: STATEMENT_ASNB_RE}
+
+# the entry date is in another year when it is this far from the value date
+YEAR_BOUNDARY_DAYS = 330
+
+
+class Unsupported(Exception):
+    """The input can not be parsed by the native engine
+    """
+
+
+def tokenize(data: str, known: Any) -> List[Tuple[str, str]]:
+    """Return the full tag id and value of every tag
+
+    The lines are cleaned up like the mt940 library does and a tag runs
+    till the next line starting with a tag known to the library.
+    """
+    result: List[Tuple[str, str]] = []
+    full_tag: Optional[str] = None
+    value: List[str] = []
+    for line in data.split('\n'):
+        line = line.replace('\r', '').rstrip()
+        if not line or line.strip() == '-':
+            continue
+        m = TAG_RE.match(line) if line[0] == ':' else None
+        if m is not None:
+            tag_id = m.group('tag')
+            if (int(tag_id) if tag_id.isdigit() else tag_id) in known:
+                if full_tag is not None:
+                    result.append((full_tag, '\n'.join(value).strip()))
+                full_tag = line[1:m.end() - 1]
+                value = [line[m.end():]]
+                continue
+        elif line == ':':
+            # a tag id on the next line
+            raise Unsupported('Colon on a line of its own')
+        if full_tag is not None:
+            value.append(line)
+    if full_tag is not None:
+        result.append((full_tag, '\n'.join(value).strip()))
+    return result
+
+
+def get_date(year: str, month: str, day: str) -> Date:
+    y = int(year)
+    if y < 1000:
+        y += 2000
+    return Date(y, int(month), int(day))
+
+
+def process(trs: Transactions, tag: tags.Tag, tag_dict: Dict[str, Any], create: Any) -> Dict[str, Any]:
+    """Run the processors of the tag around the creation of the result
+    """
+    for processor in trs.processors.get('pre_' + tag.slug, ()):
+        tag_dict = processor(trs, tag, tag_dict)
+    result: Dict[str, Any] = create(tag_dict)
+    for processor in trs.processors.get('post_' + tag.slug, ()):
+        result = processor(trs, tag, tag_dict, result)
+    return result
+
+
+def create_balance(trs: Transactions, tag: tags.Tag, value: str) -> Dict[str, Any]:
+    m = BALANCE_RE.match(value)
+    if m is None:
+        raise Unsupported('Invalid balance {!r}'.format(value))
+
+    def create(data: Dict[str, Any]) -> Dict[str, Any]:
+        data['amount'] = Amount(data['amount'], data['status'], data['currency'], options=trs.options)
+        data['date'] = get_date(data['year'], data['month'], data['day'])
+        return {tag.slug: Balance(data['status'], data['amount'], data['date'], options=trs.options)}
+
+    return process(trs, tag, m.groupdict(), create)
+
+
+def create_statement(trs: Transactions, tag: tags.Tag, value: str) -> Dict[str, Any]:
+    m = STATEMENT_TAGS[type(tag)].match(value)  # type: ignore
+    if m is None:
+        raise Unsupported('Invalid statement line {!r}'.format(value))
+
+    def create(data: Dict[str, Any]) -> Dict[str, Any]:
+        data.setdefault('currency', trs.currency)
+        data['amount'] = Amount(data['amount'], data['status'], data['currency'], options=trs.options)
+        date = data['date'] = get_date(data['year'], data['month'], data['day'])
+
+        entry_day = str(data.get('entry_day') or '')
+        entry_month = str(data.get('entry_month') or '')
+        if entry_day.isdigit() and entry_month.isdigit():
+            entry_date = Date(date.year, int(entry_month), int(entry_day))
+            if date > entry_date and (date - entry_date).days >= YEAR_BOUNDARY_DAYS:
+                entry_date = Date(entry_date.year + 1, entry_date.month, entry_date.day)
+            elif entry_date > date and (entry_date - date).days >= YEAR_BOUNDARY_DAYS:
+                entry_date = Date(entry_date.year - 1, entry_date.month, entry_date.day)
+            data['entry_date'] = entry_date
+            data['guessed_entry_date'] = entry_date
+        return data
+
+    return process(trs, tag, m.groupdict(), create)
+
+
+def add_statement(trs: Transactions, result: Dict[str, Any]) -> None:
+    """Add a statement line like Transactions._process_statement_tag()
+    """
+    if trs.transactions and not trs.transactions[-1].data.get('id'):
+        trs.transactions[-1].data.update(result)
+    else:
+        trs.transactions.append(Transaction(trs, result))
+
+
+def update_transaction(trs: Transactions, result: Dict[str, Any]) -> None:
+    """Merge into the last transaction like Transactions._update_transaction()
+    """
+    data = trs.transactions[-1].data
+    for k, v in result.items():
+        existing = data.get(k)
+        if hasattr(existing, 'strip') and hasattr(v, 'strip'):
+            data[k] += '\n' + v.strip()
+        elif v is None and trs.options.merge_keeps_values and k in data:
+            continue
+        else:
+            data[k] = v
+
+
+def parse(trs: Transactions, data: str) -> List[Transaction]:
+    """Parse MT940 data into the transactions
+    """
+    if trs.transaction_boundary:
+        raise Unsupported('Transaction boundaries')
+
+    for full_tag, value in tokenize(data, trs.tags):
+        tag = trs.tags.get(full_tag) or trs.tags[int(full_tag[:2]) if full_tag[:2].isdigit() else full_tag[:2]]
+        tag_type = type(tag)
+
+        if tag_type in REFERENCE_TAGS:
+            name, length = REFERENCE_TAGS[tag_type]
+            trs.data.update(process(trs, tag, {name: value.split('\n', 1)[0][:length]}, lambda d: d))
+        elif tag_type is tags.StatementNumber:
+            m = STATEMENT_NUMBER_RE.match(value)
+            if m is None:
+                raise Unsupported('Invalid statement number {!r}'.format(value))
+            trs.data.update(process(trs, tag, m.groupdict(), lambda d: d))
+        elif tag_type in BALANCE_TAGS:
+            trs.data.update(create_balance(trs, tag, value))
+        elif tag_type in STATEMENT_TAGS:
+            add_statement(trs, create_statement(trs, tag, value))
+        elif tag_type is tags.TransactionDetails:
+            if not trs.options.unbounded_details:
+                m = DETAILS_RE.match(value)
+                value = m.group(0) if m else ''
+            result = process(trs, tag, {'transaction_details': value}, lambda d: d)
+            # details before the first transaction are dropped
+            if trs.transactions:
+                update_transaction(trs, result)
+        else:
+            raise Unsupported('Tag {} ({})'.format(full_tag, tag_type.__name__))
+
+    return trs.transactions
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from typing import IO, Tuple
+
+import io
+import shutil
+import tempfile
+from xml.dom import minidom
+from xml.etree import ElementTree as etree
+
+from ofxstatement.ofx import OfxWriter
+from ofxstatement.statement import StatementLine
+
+from ofxstatement.plugins.mt940 import Parser
+from ofxstatement.plugins.statement import Statement
+
+# placeholder for the transactions in the document
+MARKER = 'MT940SPOOL'
+# OFX/BANKMSGSRSV1/STMTTRNRS/STMTRS/BANKTRANLIST/STMTTRN
+DEPTH = 5
+INDENT = '  '
+NEWLINE = '\r\n'
+
+
+class StreamingOfxWriter(OfxWriter):
+    """OFX writer that converts one transaction at a time
+
+    The document around the transactions is generated by the OfxWriter
+    itself with a placeholder for the transactions, so the result is the
+    same as OfxWriter.toxml().
+    """
+
+    def __init__(self, statement: Statement, pretty: bool = False) -> None:
+        super().__init__(statement)
+        self.pretty = pretty
+        self.marker = StatementLine()
+
+    def buildBankTransaction(self, line: StatementLine) -> None:
+        if line is self.marker:
+            self.tb.start(MARKER, {})
+            self.tb.end(MARKER)
+        else:
+            super().buildBankTransaction(line)
+
+    def transaction(self, line: StatementLine) -> str:
+        """Return the STMTTRN element of a statement line
+        """
+        self.tb = etree.TreeBuilder()
+        self.buildBankTransaction(line)
+        xmlstring = etree.tostring(self.tb.close(), "unicode")
+        if self.pretty:
+            element = minidom.parseString(xmlstring).documentElement
+            assert element is not None
+            out = io.StringIO()
+            element.writexml(out, INDENT * DEPTH, INDENT, NEWLINE)
+            xmlstring = out.getvalue()
+        return xmlstring
+
+    def document(self, nr_lines: int, encoding: str = "utf-8") -> Tuple[str, str]:
+        """Return the document before and after the transactions
+        """
+        lines = self.statement.lines
+        self.statement.lines = [self.marker] if nr_lines else []
+        self.tb = etree.TreeBuilder()
+        try:
+            xmlstring = self.toxml(pretty=self.pretty, encoding=encoding)
+        finally:
+            self.statement.lines = lines
+
+        if not nr_lines:
+            return xmlstring, ''
+        if self.pretty:
+            marker = INDENT * DEPTH + '<{}/>'.format(MARKER) + NEWLINE
+        else:
+            marker = '<{} />'.format(MARKER)
+        head, tail = xmlstring.split(marker)
+        return head, tail
+
+
+def write_ofx(parser: Parser, fout: IO[str], pretty: bool = False, encoding: str = "utf-8") -> Statement:
+    """Parse and write the statement as OFX while keeping just one
+    transaction in memory
+
+    Since the OFX starts with the date range of the transactions, they are
+    written to a temporary file till the statement is complete. Returns the
+    statement without lines, but with their totals for validation.
+    """
+    writer = StreamingOfxWriter(parser.statement, pretty)
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as spool:
+        for stmt_line in parser.parse_lines():
+            spool.write(writer.transaction(stmt_line))
+        statement = parser.finish()
+
+        with parser.measure('ofx'):
+            head, tail = writer.document(parser.totals.nr_lines, encoding)
+            fout.write(head)
+            spool.seek(0)
+            shutil.copyfileobj(spool, fout)
+            fout.write(tail)
+
+    return statement
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Deque, Tuple
+
+import collections
+import logging
+from pprint import pformat
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Ring buffer with the last parsed transactions
+
+    Adding a transaction just stores a reference, the formatting is done
+    when the trace is dumped after an error.
+    """
+
+    entries: Deque[Tuple[int, Any]]
+
+    def __init__(self, size: int) -> None:
+        self.entries = collections.deque(maxlen=size)
+
+    def __repr__(self) -> str:
+        return "<{}> {} entries".format(type(self).__name__, len(self.entries))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, record_nr: int, transaction: Any) -> None:
+        self.entries.append((record_nr, transaction))
+
+    def dump(self) -> None:
+        """Log the transactions in the ring buffer
+        """
+        logger.error('Last %d parsed transaction(s):', len(self.entries))
+        for record_nr, transaction in self.entries:
+            logger.error('record %d:\n%s', record_nr, pformat(transaction.data, indent=4))
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from ofxstatement.plugins.mt940_batch import EXTENSIONS, ConversionResult, convert_file, get_output_file, get_settings
+
+logger = logging.getLogger(__name__)
+
+# files that are still being uploaded
+PARTIAL_SUFFIXES = ('.part', '.filepart', '.tmp')
+
+# the size and modification time of a file
+Version = Tuple[int, int]
+
+
+class Watcher:
+    """Convert the MT940 files dropped into directories as soon as they are
+    complete
+
+    The directories are scanned every interval seconds. A file is complete
+    when its size and modification time did not change for settle seconds.
+    It is converted like ofxstatement-mt940-batch does, by a pool of threads
+    or processes that live as long as the watcher, so the plugin and its
+    imports stay loaded between files. A file is converted again when it
+    changes, but not when its OFX file is newer, e.g. after a restart. A file
+    is skipped when another one would be converted into the same OFX file,
+    like x.sta and x.txt or files with the same name in directories with one
+    output directory.
+    """
+
+    pending: Dict[str, Tuple[Version, float]]
+    done: Dict[str, Version]
+    busy: Set[str]
+    skipped: Set[str]
+    executor: Optional[Executor]
+
+    def __init__(self,
+                 directories: Sequence[str],
+                 settings: Dict[str, str],
+                 output_dir: Optional[str] = None,
+                 jobs: Optional[int] = None,
+                 processes: bool = False,
+                 pretty: bool = False,
+                 stream: bool = False,
+                 interval: float = 0.2,
+                 settle: float = 0.5) -> None:
+        self.directories = directories
+        self.settings = settings
+        self.output_dir = output_dir
+        self.jobs = jobs
+        self.processes = processes
+        self.pretty = pretty
+        self.stream = stream
+        self.interval = interval
+        self.settle = settle
+        self.pending = {}
+        self.done = {}
+        self.busy = set()
+        self.skipped = set()
+        self.executor = None
+
+    def __repr__(self) -> str:
+        return "<{}> {}, {} pending, {} busy".format(
+            type(self).__name__, ', '.join(self.directories), len(self.pending), len(self.busy))
+
+    def is_input_file(self, name: str) -> bool:
+        return not name.startswith('.') \
+            and not name.lower().endswith(PARTIAL_SUFFIXES) \
+            and os.path.splitext(name)[1].lower() in EXTENSIONS
+
+    def is_converted(self, input_file: str, version: Version) -> bool:
+        try:
+            return os.stat(get_output_file(input_file, self.output_dir)).st_mtime_ns >= version[1]
+        except FileNotFoundError:
+            return False
+
+    def scan(self, now: float) -> List[Tuple[str, Version]]:
+        """Return the files that are complete and not converted yet
+        """
+        ready: List[Tuple[str, Version]] = []
+        seen: Set[str] = set()
+        # the input file of every OFX file, the first one found wins
+        converted: Dict[str, str] = {}
+        for directory in self.directories:
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if not self.is_input_file(entry.name) or not entry.is_file():
+                        continue
+                    path = entry.path
+                    seen.add(path)
+                    output_file = get_output_file(path, self.output_dir)
+                    other = converted.setdefault(os.path.normcase(os.path.abspath(output_file)), path)
+                    if other != path:
+                        if path not in self.skipped:
+                            logger.error("%s: skipped, %s is converted into the same file %s", path, other, output_file)
+                            self.skipped.add(path)
+                        continue
+                    if path in self.busy:
+                        continue
+                    stat = entry.stat()
+                    version = (stat.st_size, stat.st_mtime_ns)
+                    if self.done.get(path) == version:
+                        continue
+                    if path not in self.pending and path not in self.done and self.is_converted(path, version):
+                        self.done[path] = version
+                        continue
+                    pending = self.pending.get(path)
+                    if pending is None or pending[0] != version:
+                        self.pending[path] = (version, now)
+                    elif now - pending[1] >= self.settle:
+                        del self.pending[path]
+                        ready.append((path, version))
+
+        # forget the files that are gone
+        for path in set(self.pending) - seen:
+            del self.pending[path]
+        for path in set(self.done) - seen:
+            del self.done[path]
+        self.skipped &= seen
+        return ready
+
+    async def convert(self, input_file: str, version: Version) -> ConversionResult:
+        """Convert a file in the pool
+        """
+        self.busy.add(input_file)
+        try:
+            loop = asyncio.get_running_loop()
+            result: ConversionResult = await loop.run_in_executor(self.executor,
+                                                                  convert_file,
+                                                                  input_file,
+                                                                  get_output_file(input_file, self.output_dir),
+                                                                  self.settings,
+                                                                  self.pretty,
+                                                                  self.stream)
+        finally:
+            self.busy.discard(input_file)
+        # a failed file is not retried till it changes
+        self.done[input_file] = version
+        if result.error:
+            logger.error("%s: %s", input_file, result.error)
+        else:
+            logger.info("Converted %s to %s, %d line(s)", input_file, result.output_file, result.nr_lines)
+        return result
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Watch the directories till stop is set, then wait for the
+        conversions that are busy
+        """
+        if stop is None:
+            stop = asyncio.Event()
+        tasks: Set[Any] = set()
+        self.executor = \
+            ProcessPoolExecutor(max_workers=self.jobs) if self.processes else ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            while not stop.is_set():
+                for input_file, version in self.scan(time.monotonic()):
+                    task = asyncio.ensure_future(self.convert(input_file, version))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                try:
+                    await asyncio.wait_for(stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+
+
+async def watch(watcher: Watcher) -> None:
+    """Run the watcher till SIGINT or SIGTERM
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            # Windows, where KeyboardInterrupt stops the loop
+            pass
+    await watcher.run(stop)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Console entry point
+    """
+    parser = argparse.ArgumentParser(description="Convert MT940 files to OFX files as soon as they arrive.")
+    parser.add_argument("-c", "--config", help="ofxstatement configuration file")
+    parser.add_argument("-t", "--type", help="configuration section to use (default: no configuration)")
+    parser.add_argument("-o", "--output-dir", help="directory for the OFX files (default: next to the input)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of files converted at the same time")
+    parser.add_argument("--processes", action="store_true", help="use processes instead of threads")
+    parser.add_argument("--pretty", action="store_true", help="pretty print the OFX output")
+    parser.add_argument("--stream", action="store_true",
+                        help="write the transactions while parsing to save memory on large files")
+    parser.add_argument("--interval", type=float, default=0.2,
+                        help="seconds between scans of the directories (default 0.2)")
+    parser.add_argument("--settle", type=float, default=0.5,
+                        help="seconds a file must not change before it is converted (default 0.5)")
+    parser.add_argument("directories", nargs="+", help="directories to watch for MT940 files")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s: %(message)s", level=logging.INFO)
+
+    try:
+        settings = get_settings(args.config, args.type)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    watcher = Watcher(args.directories,
+                      settings,
+                      output_dir=args.output_dir,
+                      jobs=args.jobs,
+                      processes=args.processes,
+                      pretty=args.pretty,
+                      stream=args.stream,
+                      interval=args.interval,
+                      settle=args.settle)
+    logger.info("Watching %s", ', '.join(args.directories))
+    try:
+        asyncio.run(watch(watcher))
+    except KeyboardInterrupt:
+        pass
+    return 0
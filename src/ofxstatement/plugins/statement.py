@@ -1,20 +1,175 @@
 # -*- coding: utf-8 -*-
-from ofxstatement.statement import Statement as BaseStatement
+from typing import Optional
+import datetime
+from decimal import Decimal
+
+from ofxstatement.statement import Statement as BaseStatement, StatementLine
 from ofxstatement.exceptions import ValidationError
 
+from ofxstatement.plugins.mt940_trace import Trace
+from ofxstatement.plugins.mt940_metrics import Metrics
+from ofxstatement.plugins.mt940_ledger import Ledger
+
+
+def to_cents(amount: Decimal) -> int:
+    """Return an amount as an exact number of cents
+
+    >>> to_cents(Decimal('-801.55')), to_cents(Decimal('6.2')), to_cents(Decimal('15'))
+    (-80155, 620, 1500)
+    """
+    cents = amount.scaleb(2)
+    if cents != cents.to_integral_value():
+        raise ValueError("Amount {} has more than 2 decimals".format(amount))
+    return int(cents)
+
+
+def from_cents(cents: int) -> Decimal:
+    """Return a number of cents as an amount with 2 decimals
+
+    >>> from_cents(-80155), from_cents(1500)
+    (Decimal('-801.55'), Decimal('15.00'))
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+class Totals:
+    """Running totals of the statement lines, updated while parsing
+
+    Besides the lines the amount of every transaction (skipped ones
+    included) is summed per bank statement for checking its balance. The
+    amounts are summed as integers so the totals are exact and cheap, in
+    cents or in a smaller unit once an amount has more decimals, e.g. the
+    fils of KWD.
+    """
+
+    min_date: Optional[datetime.date]
+    max_date: Optional[datetime.date]
+
+    def __init__(self) -> None:
+        self.nr_lines = 0
+        self.decimals = 2
+        self.units = 0
+        self.min_date = None
+        self.max_date = None
+        self.statement_units = 0
+
+    def __repr__(self) -> str:
+        return "<{}> {} line(s), amount {}, dates {} - {}".format(
+            type(self).__name__, self.nr_lines, self.amount, self.min_date, self.max_date)
+
+    @property
+    def amount(self) -> Decimal:
+        return self.from_units(self.units)
+
+    def to_units(self, amount: Decimal) -> int:
+        """Return an amount as an integer number of units, switching to a
+        smaller unit when it has more decimals
+
+        >>> totals = Totals()
+        >>> totals.to_units(Decimal('-801.55')), totals.to_units(Decimal('15'))
+        (-80155, 1500)
+        >>> totals.to_units(Decimal('65.125')), totals.decimals
+        (65125, 3)
+        """
+        exponent = amount.as_tuple().exponent
+        if isinstance(exponent, int) and -exponent > self.decimals:
+            factor = 10 ** (-exponent - self.decimals)
+            self.units *= factor
+            self.statement_units *= factor
+            self.decimals = -exponent
+        return int(amount.scaleb(self.decimals))
+
+    def from_units(self, units: int) -> Decimal:
+        """Return a number of units as an amount with the decimals of the
+        unit
+
+        >>> Totals().from_units(1500)
+        Decimal('15.00')
+        """
+        return Decimal(units).scaleb(-self.decimals)
+
+    def add(self, stmt_line: StatementLine, amount: Decimal) -> None:
+        self.nr_lines += 1
+        self.units += self.to_units(amount)
+        date = stmt_line.date
+        assert date is not None, "The statement line date should be set"
+        if self.min_date is None or date < self.min_date:
+            self.min_date = date
+        if self.max_date is None or date > self.max_date:
+            self.max_date = date
+
+    def add_transaction(self, amount: Decimal) -> None:
+        self.statement_units += self.to_units(amount)
+
+    def check_balance(self, opening_balance: Decimal, closing_balance: Decimal) -> None:
+        """Check the amount of the transactions since the previous check
+        against the balances of a bank statement
+        """
+        amount = self.from_units(self.statement_units)
+        self.statement_units = 0
+        assert opening_balance + amount == closing_balance, \
+            "Opening balance ({0}) plus the total amount ({1}) should be equal to the closing balance ({2})".format(
+                opening_balance, amount, closing_balance)
+
 
 class Statement(BaseStatement):
+    # the last parsed transactions, dumped when the statement is not valid
+    trace: Optional[Trace] = None
+    # the metrics of the conversion, written when the statement is validated
+    metrics: Optional[Metrics] = None
+    # the ledger to record the transactions in when the output is written
+    ledger: Optional[Ledger] = None
+    # the totals of the lines, computed while parsing
+    totals: Optional[Totals] = None
+
     def assert_valid(self) -> None:
+        if self.metrics is None:
+            self.check_valid()
+        else:
+            try:
+                with self.metrics.measure('assert_valid'):
+                    self.check_valid()
+            finally:
+                self.metrics.write()
+
+    def commit(self) -> None:
+        """Record the transactions in the ledger
+
+        Call this after the statement has been validated and its output has
+        been written, or a failing write would lose the transactions.
+        """
+        if self.ledger is not None:
+            self.ledger.commit()
+
+    def check_valid(self) -> None:
+        min_date: Optional[datetime.date]
+        max_date: Optional[datetime.date]
         try:
-            super().assert_valid()
+            if self.totals is None:
+                super().assert_valid()
+                dates = [sl.date for sl in self.lines if sl.date is not None]
+                min_date = min(dates, default=None)
+                max_date = max(dates, default=None)
+            else:
+                # the lines may have been written without keeping them
+                assert self.start_balance is not None and self.end_balance is not None, \
+                    "The statement start and end balance should be set"
+                assert self.start_balance + self.totals.amount == self.end_balance, \
+                    "Start balance ({0}) plus the total amount ({1}) should be equal to the end balance ({2})".format(
+                        self.start_balance, self.totals.amount, self.end_balance)
+                min_date = self.totals.min_date
+                max_date = self.totals.max_date
             assert self.end_date, "The statement end date should be set"
-            min_date = min(sl.date for sl in self.lines)
-            max_date = max(sl.date for sl in self.lines)
-            assert self.start_date <= min_date,\
+            if min_date is None or max_date is None:
+                return
+            assert self.start_date, "The statement start date should be set"
+            assert self.start_date <= min_date, \
                 "The statement start date ({}) should at most the smallest \
 statement line date ({})".format(self.start_date, min_date)
-            assert self.end_date > max_date,\
+            assert self.end_date > max_date, \
                 "The statement end date ({}) should be greater than the \
 largest statement line date ({})".format(self.end_date, max_date)
         except Exception as e:
+            if self.trace is not None:
+                self.trace.dump()
             raise ValidationError(str(e), self)
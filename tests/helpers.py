@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Samples and helpers shared by the tests
+"""
+
+# the samples with the bank code to parse them with
+SAMPLES = {'mt940_ASN.txt': 'ASN',
+           'mt940_ASN_end_date_wrong.txt': 'ASN',
+           'mt940_mBank.txt': 'MBANK',
+           'abnamro.sta': 'ABNAMRO',
+           'ing.sta': 'ING',
+           'knab.sta': 'KNAB',
+           'rabo.sta': 'RABO',
+           'sns.sta': 'SNS',
+           'triodos.sta': 'TRIODOS'}
+
+# the samples that give a valid statement
+VALID_SAMPLES = {sample: bank for sample, bank in SAMPLES.items() if sample != 'mt940_ASN_end_date_wrong.txt'}
+
+
+def line_to_dict(line):
+    """Return the attributes of a statement line to compare, with the text
+    of the amount so the number of decimals counts too
+    """
+    d = dict(vars(line))
+    if d.get('bank_account_to'):
+        d['bank_account_to'] = vars(d['bank_account_to'])
+    d['amount'] = str(d['amount'])
+    return d
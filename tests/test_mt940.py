@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
+import io
+import logging
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 from unittest import TestCase
 from decimal import Decimal
 from datetime import datetime
 import pytest
 
-from ofxstatement.plugins.mt940 import Plugin, get_bank_id
+from ofxstatement.plugins.mt940 import Plugin, get_bank_id, split_statements, parse_bytes, parse_text
 from ofxstatement.exceptions import ValidationError
+from ofxstatement.plugins.statement import to_cents, from_cents
+from ofxstatement.plugins.mt940_input import BOM
+
+from helpers import SAMPLES, line_to_dict
 
 
 class ParserTest(TestCase):
@@ -173,3 +184,279 @@ class ParserTest(TestCase):
 
         # And parse:
         parser.parse().assert_valid()
+
+    def assertSameStatement(self, actual, expected, msg):
+        for attr in ['account_id', 'currency', 'start_balance', 'start_date', 'end_balance', 'end_date']:
+            self.assertEqual(getattr(actual, attr), getattr(expected, attr), msg)
+        self.assertEqual(len(actual.lines), len(expected.lines), msg)
+        for line, expected_line in zip(actual.lines, expected.lines):
+            self.assertEqual(line_to_dict(line), line_to_dict(expected_line), msg)
+
+    def test_streaming(self):
+        """Streaming gives the same statement as reading the whole file
+        """
+        here = os.path.dirname(__file__)
+        for sample, bank in SAMPLES.items():
+            text_filename = os.path.join(here, 'samples', sample)
+            statements = []
+            for streaming in ['false', 'true']:
+                settings = {'bank_code': bank, 'streaming': streaming}
+                parser = Plugin(None, settings).get_parser(text_filename)
+                statements.append(parser.parse())
+            self.assertSameStatement(statements[1], statements[0], sample)
+
+    def test_workers(self):
+        """Parsing in parallel gives the same statement as a serial run
+        """
+        here = os.path.dirname(__file__)
+        for sample, bank in SAMPLES.items():
+            text_filename = os.path.join(here, 'samples', sample)
+            statements = []
+            for workers in ['1', '2']:
+                settings = {'bank_code': bank, 'workers': workers}
+                parser = Plugin(None, settings).get_parser(text_filename)
+                statements.append(parser.parse())
+            self.assertSameStatement(statements[1], statements[0], sample)
+
+    def test_workers_opening_balance_wrong(self):
+        """The opening balance differs from the previous closing balance
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        with open(text_filename, 'r') as fh:
+            data = fh.read().replace(':60F:C200102EUR379,29', ':60F:C200102EUR379,30')
+        parser = Plugin(None, {'workers': '2'}).get_file_object_parser(io.StringIO(data))
+
+        # And parse:
+        with self.assertLogs('ofxstatement.plugins.mt940', level='WARNING') as cm:
+            statement = parser.parse()
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn('379.30 EUR', cm.output[0])
+        self.assertEqual(len(statement.lines), 9)
+
+    def test_trace(self):
+        """The last parsed transactions are dumped for an invalid statement
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN_end_date_wrong.txt')
+        parser = Plugin(None, {'trace': '10'}).get_parser(text_filename)
+        statement = parser.parse()
+        self.assertEqual(len(parser.trace), 1)
+
+        with self.assertLogs('ofxstatement.plugins.mt940_trace', level='ERROR') as cm:
+            with self.assertRaises(ValidationError):
+                statement.assert_valid()
+        self.assertEqual(len(cm.output), 2)
+        self.assertIn('record 1:', cm.output[1])
+
+    def test_debug_logging_disabled(self):
+        """Nothing is formatted for debugging unless enabled
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        logger = logging.getLogger('ofxstatement.plugins.mt940')
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            with mock.patch('ofxstatement.plugins.mt940.pformat') as pformat:
+                Plugin(None, None).get_parser(text_filename).parse()
+            pformat.assert_not_called()
+        finally:
+            logger.setLevel(level)
+
+    def test_metrics(self):
+        """The metrics are available after parsing and written after validation
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            metrics_file = os.path.join(tmpdir, 'metrics.jsonl')
+            for streaming in ['false', 'true']:
+                settings = {'metrics_file': metrics_file, 'streaming': streaming}
+                parser = Plugin(None, settings).get_parser(text_filename)
+                statement = parser.parse()
+
+                metrics = parser.metrics.as_dict()
+                self.assertEqual(metrics['name'], text_filename)
+                self.assertEqual(metrics['transactions'], 9)
+                self.assertGreater(metrics['transactions_per_second'], 0)
+                self.assertEqual(metrics['phases']['parse_record']['calls'], 9)
+                self.assertEqual(metrics['phases']['generate_unique_transaction_id']['calls'], 9)
+                self.assertGreaterEqual(metrics['phases']['mt940']['calls'], 1)
+                self.assertNotIn('assert_valid', metrics['phases'])
+
+                statement.assert_valid()
+
+            with open(metrics_file) as fh:
+                lines = [json.loads(line) for line in fh]
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(lines[0]['phases']['assert_valid']['calls'], 1)
+            self.assertIn('read', lines[0]['phases'])
+            self.assertNotIn('read', lines[1]['phases'])
+
+    def test_totals(self):
+        """The totals are computed while parsing
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        parser = Plugin(None, {}).get_parser(text_filename)
+        statement = parser.parse()
+        self.assertEqual(statement.totals.nr_lines, 9)
+        self.assertEqual(statement.totals.amount, sum(sl.amount for sl in statement.lines))
+        self.assertEqual(statement.totals.min_date, min(sl.date for sl in statement.lines))
+        self.assertEqual(statement.totals.max_date, max(sl.date for sl in statement.lines))
+
+    def test_cents(self):
+        """The totals and balances are exact, the line amounts are as read
+        """
+        here = os.path.dirname(__file__)
+        text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        parser = Plugin(None, {}).get_parser(text_filename)
+        statement = parser.parse()
+        self.assertEqual(statement.totals.units, sum(to_cents(sl.amount) for sl in statement.lines))
+        self.assertEqual(statement.start_balance + statement.totals.amount, statement.end_balance)
+        for sl, transaction in zip(statement.lines, parser.trs):
+            self.assertIs(sl.amount, transaction.data['amount'].amount)
+
+        self.assertEqual(to_cents(Decimal('6.2')), 620)
+        self.assertEqual(from_cents(-5), Decimal('-0.05'))
+        with self.assertRaises(ValueError):
+            to_cents(Decimal('0.001'))
+
+    def test_three_decimals(self):
+        """Currencies like KWD have amounts with three decimals
+        """
+        data = """:20:STMT
+:25:KW81CBKU0000000000001234560101
+:28C:1/1
+:60F:C200101KWD1000,000
+:61:2001010101D65,125NTRFNONREF
+:86:Payment
+:61:2001020102C0,5NTRFNONREF
+:86:Refund
+:62F:C200102KWD935,375
+"""
+        for engine in ['mt940', 'native']:
+            settings = {'bank_code': 'ING', 'check_balances': 'true', 'engine': engine}
+            statement = Plugin(None, settings).get_file_object_parser(io.StringIO(data)).parse()
+            statement.assert_valid()
+            self.assertEqual([str(sl.amount) for sl in statement.lines], ['-65.125', '0.5'])
+            self.assertEqual(statement.totals.amount, Decimal('-64.625'))
+            self.assertEqual(str(statement.start_balance), '1000.000')
+            self.assertEqual(str(statement.end_balance), '935.375')
+
+        # the unit gets smaller when needed
+        statement = Plugin(None, {'bank_code': 'ING'}).get_file_object_parser(
+            io.StringIO(data.replace('65,125', '65,1').replace('935,375', '935,4'))).parse()
+        statement.assert_valid()
+        self.assertEqual(str(statement.start_balance), '1000.00')
+
+    def test_check_balances(self):
+        """A bank statement that does not add up fails while parsing
+        """
+        here = os.path.dirname(__file__)
+        for streaming, workers in [('false', '1'), ('true', '1'), ('false', '2')]:
+            settings = {'check_balances': 'true', 'streaming': streaming, 'workers': workers}
+
+            text_filename = os.path.join(here, 'samples', 'mt940_mBank.txt')
+            parser = Plugin(None, dict(settings, bank_code='MBANK')).get_parser(text_filename)
+            parser.parse().assert_valid()
+
+            # the last bank statement contains a duplicate
+            text_filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+            parser = Plugin(None, settings).get_parser(text_filename)
+            with self.assertRaises(ValidationError) as cm:
+                parser.parse()
+            self.assertTrue(cm.exception.message.startswith('Bank statement of 2020-01-31: Opening balance (404.81)'),
+                            cm.exception.message)
+            self.assertEqual(parser.cur_record, 9)
+
+    def test_parse_accounts(self):
+        """A statement per account with its own balances and dates
+        """
+        here = os.path.dirname(__file__)
+        with open(os.path.join(here, 'samples', 'mt940_ASN.txt')) as fh:
+            chunks = split_statements(fh.read())
+        # the statements from the 5th of January are of another account
+        other = 'NL56ASNB9999999999'
+        data = ''.join(chunk.replace('NL81ASNB9999999999', other) if 4 <= i < 29 else chunk
+                       for i, chunk in enumerate(chunks))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ledger = os.path.join(tmpdir, 'ledger.sqlite')
+            results = []
+            for workers in ['1', '2']:
+                parser = Plugin(None, {'workers': workers, 'ledger': ledger}).get_file_object_parser(io.StringIO(data))
+                statements = parser.parse_accounts()
+                self.assertEqual([statement.account_id for statement in statements], ['NL81ASNB9999999999', other])
+                results.append([[line_to_dict(sl) for sl in statement.lines] for statement in statements])
+                # the accounts share the ledger of the file
+                self.assertEqual([statement.ledger for statement in statements], [parser.ledger] * 2)
+                self.assertEqual(len(parser.ledger.pending), 9)
+                parser.ledger.release()
+            self.assertEqual(results[0], results[1])
+
+            first, second = statements
+            self.assertEqual((first.start_balance, first.end_balance), (Decimal('-530.37'), Decimal('501.23')))
+            self.assertEqual((first.start_date, first.end_date),
+                             (datetime(2020, 1, 1).date(), datetime(2020, 2, 1).date()))
+            self.assertEqual((second.start_balance, second.end_balance), (Decimal('379.29'), Decimal('404.81')))
+            self.assertEqual((second.start_date, second.end_date),
+                             (datetime(2020, 1, 5).date(), datetime(2020, 1, 30).date()))
+            for statement in statements:
+                statement.assert_valid()
+                statement.ledger.close()
+
+    def test_parse_text(self):
+        """Parsing in memory gives the same statement as parsing the file
+        """
+        here = os.path.dirname(__file__)
+        for sample, bank in SAMPLES.items():
+            text_filename = os.path.join(here, 'samples', sample)
+            settings = {'bank_code': bank}
+            expected = Plugin(None, settings).get_parser(text_filename).parse()
+            with open(text_filename, 'rb') as fh:
+                data = fh.read()
+            self.assertSameStatement(parse_bytes(data, settings), expected, sample)
+            self.assertSameStatement(parse_text(data.decode('utf-8'), settings), expected, sample)
+
+        # a statement in Latin-1 does not change the others, nor does a
+        # byte order mark
+        with open(os.path.join(here, 'samples', 'mt940_ASN.txt'), 'rb') as fh:
+            data = BOM + fh.read().replace(b'Kosten', 'Kösten'.encode('latin-1'))
+        details = data.index(b':86:') + len(b':86:')
+        data = data[:details] + 'café'.encode('utf-8') + data[details:]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'mixed.sta')
+            with open(filename, 'wb') as fh:
+                fh.write(data)
+            for settings in [{}, {'streaming': 'true'}, {'workers': '2'}]:
+                expected = Plugin(None, settings).get_parser(filename).parse()
+                statement = parse_bytes(data, settings)
+                self.assertSameStatement(statement, expected, settings)
+                self.assertIn('café', statement.lines[0].memo)
+                self.assertIn('Kösten', statement.lines[3].memo)
+
+    def test_threads(self):
+        """Many threads parsing at once give the same statements as one
+        """
+        here = os.path.dirname(__file__)
+        jobs = []
+        for sample, bank in SAMPLES.items():
+            with open(os.path.join(here, 'samples', sample), 'rb') as fh:
+                data = fh.read()
+            for engine in ['mt940', 'native']:
+                settings = {'bank_code': bank, 'engine': engine}
+                jobs.append((data, settings, [line_to_dict(sl) for sl in parse_bytes(data, settings).lines]))
+
+        def parse(job):
+            data, settings, expected = job
+            return [line_to_dict(sl) for sl in parse_bytes(data, settings).lines] == expected
+
+        for threads in [1, 2, 4, 8]:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = list(executor.map(parse, jobs * 10))
+            seconds = time.perf_counter() - start
+            self.assertTrue(all(results))
+            logging.getLogger(__name__).info('%d thread(s): %.0f statements/s', threads, len(results) / seconds)
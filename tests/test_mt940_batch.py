@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+
+from ofxstatement.plugins.mt940_batch import convert_file, convert_files, find_files, main, merge_files
+
+
+class BatchTest(TestCase):
+
+    def setUp(self):
+        here = os.path.dirname(__file__)
+        self.pattern = os.path.join(here, 'samples', 'mt940_ASN*.txt')
+        self.output_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def test_find_files(self):
+        here = os.path.dirname(__file__)
+        files = find_files([os.path.join(here, 'samples')])
+        self.assertEqual(len(files), 9)
+
+        files = find_files([self.pattern])
+        self.assertEqual([os.path.basename(f) for f in files],
+                         ['mt940_ASN.txt', 'mt940_ASN_end_date_wrong.txt'])
+
+    def test_convert_files(self):
+        """A failure does not stop the batch
+        """
+        for processes, stream in [(False, False), (True, False), (False, True)]:
+            results = convert_files(find_files([self.pattern]),
+                                    {},
+                                    output_dir=self.output_dir.name,
+                                    jobs=2,
+                                    processes=processes,
+                                    stream=stream)
+            self.assertEqual(len(results), 2)
+
+            self.assertIsNone(results[0].error)
+            self.assertEqual(results[0].nr_lines, 9)
+            with open(results[0].output_file) as fh:
+                self.assertIn('<ACCTID>NL81ASNB9999999999</ACCTID>', fh.read())
+
+            self.assertTrue(results[1].error.startswith('ValidationError: The statement end date'))
+            self.assertFalse(os.path.exists(results[1].output_file))
+
+    def test_main(self):
+        self.assertEqual(main(['-o', self.output_dir.name, self.pattern]), 2)
+        self.assertEqual(os.listdir(self.output_dir.name), ['mt940_ASN.ofx'])
+
+    def test_same_output_file(self):
+        """Nothing is converted when two files would be converted into the
+        same OFX file
+        """
+        input_file = find_files([self.pattern])[0]
+        with open(input_file) as fh:
+            data = fh.read()
+        for name in ('x.sta', 'x.txt'):
+            with open(os.path.join(self.output_dir.name, name), 'w') as fh:
+                fh.write(data)
+
+        with self.assertRaisesRegex(ValueError, r'x\.ofx'):
+            convert_files(find_files([self.output_dir.name]), {})
+        self.assertEqual(main([self.output_dir.name]), 1)
+        # the same name in different directories
+        os.mkdir(os.path.join(self.output_dir.name, 'other'))
+        other_file = os.path.join(self.output_dir.name, 'other', os.path.basename(input_file))
+        with open(other_file, 'w') as fh:
+            fh.write(data)
+        self.assertEqual(main(['-o', self.output_dir.name, input_file, other_file]), 1)
+        self.assertEqual(sorted(os.listdir(self.output_dir.name)), ['other', 'x.sta', 'x.txt'])
+
+    def test_accounts(self):
+        """An OFX file per account
+        """
+        with open(find_files([self.pattern])[0]) as fh:
+            data = fh.read()
+        input_file = os.path.join(self.output_dir.name, 'accounts.sta')
+        with open(input_file, 'w') as fh:
+            fh.write(data + data.replace('NL81ASNB9999999999', 'NL56ASNB9999999999'))
+
+        self.assertEqual(main(['--accounts', input_file]), 0)
+        self.assertEqual(sorted(os.listdir(self.output_dir.name)),
+                         ['accounts.sta', 'accounts_NL56ASNB9999999999.ofx', 'accounts_NL81ASNB9999999999.ofx'])
+        with open(os.path.join(self.output_dir.name, 'accounts_NL56ASNB9999999999.ofx')) as fh:
+            self.assertIn('<ACCTID>NL56ASNB9999999999</ACCTID>', fh.read())
+
+        with self.assertRaises(SystemExit):
+            main(['--accounts', '--stream', input_file])
+
+    def test_accounts_ledger(self):
+        """Nothing is written nor recorded in the ledger when an account
+        is not valid
+        """
+        data = []
+        for input_file in find_files([self.pattern]):
+            with open(input_file) as fh:
+                data.append(fh.read())
+        input_file = os.path.join(self.output_dir.name, 'accounts.sta')
+        with open(input_file, 'w') as fh:
+            fh.write(data[0] + data[1].replace('NL81ASNB9999999999', 'NL56ASNB9999999999'))
+        settings = {'ledger': os.path.join(self.output_dir.name, 'ledger.sqlite')}
+
+        result = convert_file(input_file, input_file.replace('.sta', '.ofx'), settings, accounts=True)
+        self.assertTrue(result.error.startswith('ValidationError'))
+        self.assertEqual(sorted(os.listdir(self.output_dir.name)), ['accounts.sta', 'ledger.sqlite'])
+
+        with open(input_file, 'w') as fh:
+            fh.write(data[0])
+        result = convert_file(input_file, input_file.replace('.sta', '.ofx'), settings, accounts=True)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.nr_lines, 9)
+
+    def test_ledger_concurrent(self):
+        """Files converted at the same time do not export the same
+        transactions twice
+        """
+        with open(find_files([self.pattern])[0]) as fh:
+            data = fh.read()
+        input_files = []
+        for name in ('a.sta', 'b.sta', 'c.sta', 'd.sta'):
+            input_files.append(os.path.join(self.output_dir.name, name))
+            with open(input_files[-1], 'w') as fh:
+                fh.write(data)
+
+        for processes, stream in [(False, False), (True, False), (False, True)]:
+            settings = {'ledger': os.path.join(self.output_dir.name, 'ledger{}{}.sqlite'.format(processes, stream))}
+            results = convert_files(input_files, settings, jobs=4, processes=processes, stream=stream)
+            self.assertEqual([result.error for result in results], [None] * 4)
+            self.assertEqual(sorted(result.nr_lines for result in results), [0, 0, 0, 9])
+
+    def test_merge(self):
+        """One OFX file for overlapping files
+        """
+        input_file = find_files([self.pattern])[0]
+        output_file = os.path.join(self.output_dir.name, 'merged.ofx')
+        for stream in [False, True]:
+            result = merge_files([input_file, input_file], output_file, {}, stream=stream)
+            self.assertIsNone(result.error)
+            self.assertEqual(result.nr_lines, 9)
+
+        self.assertEqual(main(['--merge', 'merged.ofx', '-o', self.output_dir.name, input_file]), 0)
+        with open(output_file) as fh:
+            self.assertEqual(fh.read().count('<STMTTRN>'), 9)
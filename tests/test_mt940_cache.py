@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from ofxstatement.ofx import OfxWriter
+
+from ofxstatement.plugins.mt940 import Plugin
+
+
+class CacheTest(TestCase):
+
+    def setUp(self):
+        here = os.path.dirname(__file__)
+        self.filename = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings = {'cache_dir': os.path.join(self.tmpdir.name, 'cache')}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def parse(self, filename, settings=None):
+        parser = Plugin(None, settings or self.settings).get_parser(filename)
+        try:
+            return parser.parse()
+        finally:
+            parser.fin.close()
+
+    def cache_files(self):
+        return os.listdir(self.settings['cache_dir'])
+
+    def test_hit(self):
+        statement = self.parse(self.filename)
+        self.assertEqual(len(self.cache_files()), 1)
+
+        with mock.patch('ofxstatement.plugins.mt940.create_transactions') as create_transactions:
+            cached = self.parse(self.filename)
+            create_transactions.assert_not_called()
+
+        self.assertEqual(OfxWriter(cached).toxml(), OfxWriter(statement).toxml())
+        self.assertIs(type(cached.lines[0].date), type(statement.lines[0].date))
+        self.assertIs(type(cached.end_date), type(statement.end_date))
+        cached.assert_valid()
+
+    def test_settings(self):
+        self.parse(self.filename)
+        self.parse(self.filename, dict(self.settings, end_date_derived_from_statements='true'))
+        self.assertEqual(len(self.cache_files()), 2)
+
+    def test_input_encoding(self):
+        self.parse(self.filename)
+        self.parse(self.filename, dict(self.settings, input_encoding='latin-1'))
+        self.assertEqual(len(self.cache_files()), 2)
+        # auto is the default
+        self.parse(self.filename, dict(self.settings, input_encoding='auto'))
+        self.assertEqual(len(self.cache_files()), 2)
+
+    def test_structured_details(self):
+        filename = os.path.join(os.path.dirname(__file__), 'samples', 'knab.sta')
+        settings = dict(self.settings, bank_code='KNAB')
+        plain = self.parse(filename, dict(settings, structured_details='false'))
+        statement = self.parse(filename, dict(settings, structured_details='true'))
+        self.assertEqual(len(self.cache_files()), 2)
+        self.assertNotEqual(statement.lines[1].memo, plain.lines[1].memo)
+        self.assertEqual(statement.lines[1].memo, 'FACTUUR 201403110, 201403113')
+
+    def test_max_size(self):
+        settings = dict(self.settings, cache_max_size='1')
+        self.parse(self.filename, settings)
+        self.assertEqual(self.cache_files(), [])
+
+    def test_evicted_meanwhile(self):
+        """A cache file removed by another conversion is no error
+        """
+        statement = self.parse(self.filename)
+        with mock.patch('os.utime', side_effect=FileNotFoundError):
+            cached = self.parse(self.filename)
+        self.assertEqual(OfxWriter(cached).toxml(), OfxWriter(statement).toxml())
+
+        gone = mock.Mock()
+        gone.name = 'gone.json.z'
+        gone.stat.side_effect = FileNotFoundError
+        with mock.patch('os.scandir', return_value=[gone]):
+            self.parse(self.filename, dict(self.settings, cache_max_size='1', structured_details='true'))
+        gone.stat.assert_called_once_with()
+
+    def test_ledger(self):
+        settings = dict(self.settings, ledger=os.path.join(self.tmpdir.name, 'ledger.sqlite'))
+        with self.assertLogs('ofxstatement.plugins.mt940', 'WARNING'):
+            parser = Plugin(None, settings).get_parser(self.filename)
+        parser.fin.close()
+        parser.ledger.close()
+        self.assertIsNone(parser.cache)
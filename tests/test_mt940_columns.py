@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase, mock
+
+from ofxstatement.ofx import OfxWriter
+from ofxstatement.statement import StatementLine, BankAccount
+
+from ofxstatement.plugins.mt940 import Plugin
+from ofxstatement.plugins.mt940_columns import LineColumns
+
+from helpers import VALID_SAMPLES, line_to_dict
+
+
+class LineColumnsTest(TestCase):
+
+    def parse(self, sample, settings):
+        here = os.path.dirname(__file__)
+        parser = Plugin(None, dict(settings, bank_code=VALID_SAMPLES[sample])).get_parser(os.path.join(here, 'samples', sample))
+        return parser.parse()
+
+    @mock.patch('ofxstatement.ofx.datetime')
+    def test_same_statement(self, ofx_datetime):
+        """The lines are the same and so is the OFX
+        """
+        ofx_datetime.now.return_value = datetime(2020, 2, 3, 4, 5, 6)
+        for sample in VALID_SAMPLES:
+            expected = self.parse(sample, {})
+            statement = self.parse(sample, {'compact': 'true'})
+            self.assertIsInstance(statement.lines, LineColumns)
+            self.assertEqual([line_to_dict(sl) for sl in statement.lines],
+                             [line_to_dict(sl) for sl in expected.lines],
+                             sample)
+            self.assertEqual(OfxWriter(statement).toxml(), OfxWriter(expected).toxml(), sample)
+
+    def test_other_attributes(self):
+        """Attributes without a column are kept too
+        """
+        lines = [StatementLine(id='x1', date=datetime(2020, 1, 2, 3, 4), memo=None, amount=Decimal('1.005')),
+                 StatementLine(id='a' * 40 + '-2', date=date(2020, 1, 2), memo='Memo €', amount=Decimal('-15'))]
+        lines[0].trntype = 'DEBIT'
+        lines[0].refnum = '123'
+        lines[0].bank_account_to = BankAccount(bank_id='INGBNL2A', acct_id='NL47INGB9999999999')
+        lines[1].payee = 'Payee'
+        lines[1].bank_account_to = BankAccount(bank_id=None, acct_id='NL47INGB9999999999')
+
+        columns = LineColumns(lines)
+        self.assertEqual(len(columns), 2)
+        self.assertEqual(list(columns.extras), [0])
+        self.assertEqual([line_to_dict(sl) for sl in columns], [line_to_dict(sl) for sl in lines])
+        self.assertEqual(columns[1].trntype, 'CHECK')
+
+        self.assertEqual(columns[-1].memo, 'Memo €')
+        self.assertEqual([sl.id for sl in columns[1:]], [lines[1].id])
+        with self.assertRaises(IndexError):
+            columns[2]
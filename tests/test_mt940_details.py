@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+from unittest import TestCase
+
+from ofxstatement.plugins.mt940 import Plugin
+from ofxstatement.plugins.mt940_details import Details, get_details, slash_fields
+
+ING = ('/EREF/NOTPROVIDED//CNTP/NL55INGB0000000000/INGBNL2A/J. Doe\n'
+       '///REMI/USTD//Huur februari/')
+
+ABNAMRO = ('/TRTP/SEPA OVERBOEKING/IBAN/NL44RABO0123456789/BIC/RABONL2U/NAME/\n'
+           'PICQER BV/REMI/FACTUUR 201403110/EREF/NOTPROVIDED')
+
+
+class DetailsTest(TestCase):
+
+    def parse(self, sample, bank_code, structured_details):
+        here = os.path.dirname(__file__)
+        settings = {'bank_code': bank_code, 'structured_details': structured_details}
+        return Plugin(None, settings).get_parser(os.path.join(here, 'samples', sample)).parse()
+
+    def test_plain(self):
+        """The memo and payee are the same as always, also for structured details
+        """
+        self.assertEqual(get_details(None, 'NL47INGB9999999999 hr gjlm paulissen\n \nBetaling sieraden  \n',
+                                     'NL47INGB9999999999', 'hr gjlm paulissen'),
+                         Details('Betaling sieraden', 'hr gjlm paulissen (NL47INGB9999999999)', 'NL47INGB9999999999'))
+        self.assertEqual(get_details(None, ING, '', ''),
+                         Details(ING.replace('\n', ''), None, None))
+
+    def test_slash(self):
+        self.assertEqual(slash_fields(ING), {'EREF': 'NOTPROVIDED',
+                                             'CNTP': 'NL55INGB0000000000/INGBNL2A/J. Doe',
+                                             'REMI': 'USTD//Huur februari'})
+        self.assertEqual(get_details('ING', ING, '', ''),
+                         Details('Huur februari', 'J. Doe (NL55INGB0000000000)', 'NL55INGB0000000000'))
+        self.assertEqual(get_details('ABNAMRO', ABNAMRO, 'NONREF', ''),
+                         Details('FACTUUR 201403110', 'PICQER BV (NL44RABO0123456789)', 'NL44RABO0123456789'))
+        self.assertEqual(get_details('RABO', '/EREF/12345//REMI/STRD/CUR/987654321/', 'NL44RABO0123456789', ''),
+                         Details('987654321', None, 'NL44RABO0123456789'))
+        # not structured
+        self.assertIsNone(slash_fields('BETALINGSKENM. 123/NAME/'))
+
+    def test_gvc(self):
+        statement = self.parse('triodos.sta', 'TRIODOS', 'true')
+        self.assertEqual(statement.lines[0].memo, 'ALGEMENE TUSSENREKENING KOSTEN VAN 01-10-2010 TOT EN MET 31-12-2010')
+        self.assertEqual(statement.lines[0].bank_account_to.acct_id, '0390123456')
+        self.assertEqual(get_details('TRIODOS', '166?00SEPA-UEBERWEISUNG?20EREF+1?21Miete?3112345678?32MAX ?33MUSTERMANN', '', ''),
+                         Details('EREF+1Miete', 'MAX MUSTERMANN (12345678)', '12345678'))
+
+    def test_knab(self):
+        plain = self.parse('knab.sta', 'KNAB', 'false')
+        statement = self.parse('knab.sta', 'KNAB', 'true')
+        # the first is not structured
+        self.assertEqual(statement.lines[0].memo, plain.lines[0].memo)
+        self.assertEqual(statement.lines[1].memo, 'FACTUUR 201403110, 201403113')
+        self.assertEqual(statement.lines[1].payee, 'PICQER (NL65INGB0123456789)')
+        self.assertEqual(statement.lines[1].bank_account_to.acct_id, 'NL65INGB0123456789')
+        statement.assert_valid()
+
+    def test_cache(self):
+        """Recurring transaction details are split once
+        """
+        get_details.cache_clear()
+        for _ in range(3):
+            get_details('ING', ING, '', '')
+        info = get_details.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
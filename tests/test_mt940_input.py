@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+
+from ofxstatement.plugins.mt940 import Plugin, split_statements
+from ofxstatement.plugins.mt940_input import MappedFile, BOM
+
+from helpers import VALID_SAMPLES, line_to_dict
+
+
+class MappedFileTest(TestCase):
+
+    def setUp(self):
+        self.samples = os.path.join(os.path.dirname(__file__), 'samples')
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, data):
+        filename = os.path.join(self.tmpdir.name, 'statement.sta')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+        return filename
+
+    def read(self, sample):
+        with open(os.path.join(self.samples, sample), 'rb') as fh:
+            return fh.read()
+
+    def test_statements(self):
+        """The statements are split like split_statements() does
+        """
+        for sample in VALID_SAMPLES:
+            with open(os.path.join(self.samples, sample), 'r') as fh:
+                expected = split_statements(fh.read())
+            mapped = MappedFile(os.path.join(self.samples, sample))
+            self.assertEqual(list(mapped.statements()), expected, sample)
+            self.assertIsNone(mapped.file)
+
+            # the line endings do not matter
+            mapped = MappedFile(self.write(self.read(sample).replace(b'\n', b'\r\n')))
+            self.assertEqual(list(mapped.statements()), expected, sample)
+            self.assertEqual(''.join(mapped), ''.join(expected), sample)
+
+    def test_same_statement(self):
+        """Parsing the mapped file gives the same statement as a text file
+        """
+        for sample, bank in VALID_SAMPLES.items():
+            filename = os.path.join(self.samples, sample)
+            for settings in [{}, {'engine': 'native'}, {'streaming': 'true'}, {'workers': '2'}]:
+                plugin = Plugin(None, dict(settings, bank_code=bank))
+                with open(filename, 'r') as fh:
+                    expected = plugin.get_file_object_parser(fh).parse()
+                parser = plugin.get_parser(filename)
+                self.assertIsInstance(parser.fin, MappedFile)
+                statement = parser.parse()
+                self.assertIsNone(parser.fin.file, (sample, settings))
+                self.assertEqual([line_to_dict(sl) for sl in statement.lines],
+                                 [line_to_dict(sl) for sl in expected.lines],
+                                 (sample, settings))
+                for attr in ['account_id', 'currency', 'start_balance', 'start_date', 'end_balance', 'end_date']:
+                    self.assertEqual(getattr(statement, attr), getattr(expected, attr), (sample, settings, attr))
+
+    def test_encoding(self):
+        data = self.read('mt940_ASN.txt')
+        memo = 'Kosten gebruik betaalrekening inclusief 1 betaalpas'
+        for encoding in ['utf-8', 'latin-1']:
+            filename = self.write(data.replace(b'Kosten', 'Kösten'.encode(encoding)))
+            for input_encoding in ['auto', encoding]:
+                statement = Plugin(None, {'input_encoding': input_encoding}).get_parser(filename).parse()
+                self.assertEqual(statement.lines[3].memo, memo.replace('Kosten', 'Kösten'), (encoding, input_encoding))
+
+        filename = self.write(data.replace(b'Kosten', 'Kosten€'.encode('cp1252')))
+        statement = Plugin(None, {'input_encoding': 'CP1252'}).get_parser(filename).parse()
+        self.assertEqual(statement.lines[3].memo, memo.replace('Kosten', 'Kosten€'))
+
+        with self.assertRaises(LookupError):
+            Plugin(None, {'input_encoding': 'ebcdic'}).get_parser(filename)
+
+    def test_mixed_encoding(self):
+        """A statement with lines in UTF-8 and Latin-1 gives the same memo
+        with and without streaming
+        """
+        data = self.read('mt940_ASN.txt')
+        details = data.rindex(b':86: ', 0, data.index(b'Kosten')) + len(b':86: ')
+        data = data[:details] + 'café'.encode('utf-8') + data[details:].replace(b'Kosten', 'Kösten'.encode('latin-1'))
+        filename = self.write(data)
+        for streaming in ['false', 'true']:
+            statement = Plugin(None, {'streaming': streaming}).get_parser(filename).parse()
+            self.assertIn('café', statement.lines[3].memo, streaming)
+            self.assertIn('Kösten', statement.lines[3].memo, streaming)
+
+    def test_bom(self):
+        filename = self.write(BOM + self.read('mt940_ASN.txt'))
+        statement = Plugin(None, {}).get_parser(filename).parse()
+        self.assertEqual(statement.account_id, 'NL81ASNB9999999999')
+        self.assertEqual(len(statement.lines), 9)
+
+    def test_closed(self):
+        """The file is only open while parsing
+        """
+        filename = self.write(b'')
+        mapped = MappedFile(filename)
+        self.assertEqual(list(mapped.statements()), [])
+        self.assertEqual(mapped.read(), '')
+
+        filename = self.write(self.read('mt940_ASN.txt').replace(b':62F:', b':62F:X'))
+        parser = Plugin(None, {}).get_parser(filename)
+        self.assertIsNone(parser.fin.file)
+        with self.assertRaises(Exception):
+            parser.parse()
+        self.assertIsNone(parser.fin.file)
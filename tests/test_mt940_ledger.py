@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+from unittest import TestCase
+from decimal import Decimal
+from datetime import date
+
+from ofxstatement.plugins.mt940 import Plugin
+from ofxstatement.plugins.mt940_batch import convert_file
+
+
+class LedgerTest(TestCase):
+
+    def setUp(self):
+        here = os.path.dirname(__file__)
+        with open(os.path.join(here, 'samples', 'mt940_ASN.txt'), 'r') as fh:
+            self.data = fh.read()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings = {'ledger': os.path.join(self.tmpdir.name, 'ledger.sqlite')}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def parse(self, data):
+        parser = Plugin(None, self.settings).get_file_object_parser(io.StringIO(data))
+        statement = parser.parse()
+        statement.assert_valid()
+        statement.commit()
+        parser.ledger.close()
+        return statement
+
+    def test_same_file(self):
+        statement = self.parse(self.data)
+        self.assertEqual(len(statement.lines), 9)
+
+        statement = self.parse(self.data)
+        self.assertEqual(len(statement.lines), 0)
+        self.assertEqual(statement.start_balance, Decimal('501.23'))
+        self.assertEqual(statement.end_balance, Decimal('501.23'))
+        self.assertEqual(statement.start_date, date(2020, 1, 31))
+        self.assertEqual(statement.end_date, date(2020, 2, 1))
+
+    def test_overlapping_files(self):
+        # just the first statement with one transaction
+        first = self.data[:self.data.index('{1:', 1)]
+        statement = self.parse(first)
+        self.assertEqual(len(statement.lines), 1)
+
+        statement = self.parse(self.data)
+        self.assertEqual(len(statement.lines), 8)
+        self.assertEqual(statement.lines[0].amount, Decimal('1000.00'))
+        self.assertEqual(statement.start_balance, Decimal('501.23') - sum(sl.amount for sl in statement.lines))
+        self.assertEqual(statement.start_date, statement.lines[0].date)
+
+    def test_not_validated(self):
+        """Transactions are only recorded for a valid statement
+        """
+        parser = Plugin(None, self.settings).get_file_object_parser(io.StringIO(self.data))
+        self.assertEqual(len(parser.parse().lines), 9)
+        parser.ledger.close()
+
+        # validated but not written
+        parser = Plugin(None, self.settings).get_file_object_parser(io.StringIO(self.data))
+        parser.parse().assert_valid()
+        parser.ledger.close()
+
+        self.assertEqual(len(self.parse(self.data).lines), 9)
+
+    def test_write_failed(self):
+        """Transactions are only recorded once the OFX file is written
+        """
+        input_file = os.path.join(self.tmpdir.name, 'mt940_ASN.txt')
+        with open(input_file, 'w') as fh:
+            fh.write(self.data)
+        missing = os.path.join(self.tmpdir.name, 'missing', 'mt940_ASN.ofx')
+        for stream in [False, True]:
+            result = convert_file(input_file, missing, self.settings, stream=stream)
+            self.assertTrue(result.error.startswith('FileNotFoundError'))
+
+        result = convert_file(input_file, os.path.join(self.tmpdir.name, 'mt940_ASN.ofx'), self.settings)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.nr_lines, 9)
+        self.assertEqual(len(self.parse(self.data).lines), 0)
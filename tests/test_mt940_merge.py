@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+
+from ofxstatement.exceptions import ValidationError
+
+from ofxstatement.plugins.mt940 import Plugin, split_statements
+from ofxstatement.plugins.mt940_input import MappedFile
+from ofxstatement.plugins.mt940_merge import get_opening_balance, sort_files
+
+
+class MergeTest(TestCase):
+
+    def setUp(self):
+        here = os.path.dirname(__file__)
+        self.sample = os.path.join(here, 'samples', 'mt940_ASN.txt')
+        with open(self.sample) as fh:
+            self.statements = split_statements(fh.read())
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.plugin = Plugin(None, {})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, begin, end, account=None):
+        """Write some of the statements of the sample to a file
+        """
+        data = ''.join(self.statements[begin:end])
+        if account is not None:
+            data = data.replace('NL81ASNB9999999999', account)
+        filename = os.path.join(self.tmpdir.name, name)
+        with open(filename, 'w') as fh:
+            fh.write(data)
+        return filename
+
+    def test_sort_files(self):
+        files = [MappedFile(self.write('b.sta', 10, 31)), MappedFile(self.write('a.sta', 0, 15))]
+        self.assertEqual(get_opening_balance(files[0]), ('200111', Decimal('577.74')))
+        self.assertEqual([os.path.basename(fin.name) for fin in sort_files(files)], ['a.sta', 'b.sta'])
+
+    def test_merge(self):
+        """Overlapping files give the same statement as the file they were
+        taken from
+        """
+        expected = self.plugin.get_parser(self.sample).parse()
+        files = [self.write('b.sta', 10, 31), self.write('c.sta', 3, 8), self.write('a.sta', 0, 15)]
+        statement = self.plugin.get_merge_parser(files).parse()
+        statement.assert_valid()
+        self.assertEqual([(sl.id, sl.memo, sl.amount) for sl in statement.lines],
+                         [(sl.id, sl.memo, sl.amount) for sl in expected.lines])
+        for attr in ['account_id', 'currency', 'start_balance', 'start_date', 'end_balance', 'end_date']:
+            self.assertEqual(getattr(statement, attr), getattr(expected, attr), attr)
+
+        # the same transactions repeated in one file are kept
+        files = [self.write('d.sta', 30, 31)] * 2
+        statement = self.plugin.get_merge_parser(files).parse()
+        self.assertEqual([str(sl.amount) for sl in statement.lines], ['1000.18', '1000.18', '-903.76'])
+
+    def test_gap(self):
+        files = [self.write('a.sta', 0, 15), self.write('b.sta', 29, 31)]
+        with self.assertRaises(ValidationError) as cm:
+            self.plugin.get_merge_parser(files).parse()
+        self.assertTrue(cm.exception.message.startswith('The opening balance (404.81) of {} should be equal to the balance (577.74)'.format(files[1])))
+
+    def test_other_account(self):
+        files = [self.write('a.sta', 0, 15), self.write('b.sta', 10, 31, 'NL56ASNB9999999999')]
+        with self.assertRaises(ValidationError) as cm:
+            self.plugin.get_merge_parser(files).parse()
+        self.assertIn('The account (NL56ASNB9999999999)', cm.exception.message)
+
+    def test_three_decimals(self):
+        data = """:20:STMT
+:25:KW81CBKU0000000000001234560101
+:28C:1/1
+:60F:C200101KWD1000,000
+:61:2001010101D65,125NTRFNONREF
+:86:Payment
+:62F:C200101KWD934,875
+"""
+        filename = os.path.join(self.tmpdir.name, 'kwd.sta')
+        with open(filename, 'w') as fh:
+            fh.write(data)
+        statement = Plugin(None, {'bank_code': 'ING'}).get_merge_parser([filename, filename]).parse()
+        statement.assert_valid()
+        self.assertEqual([str(sl.amount) for sl in statement.lines], ['-65.125'])
+        self.assertEqual(str(statement.start_balance), '1000.000')
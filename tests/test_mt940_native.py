@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+from unittest import TestCase
+
+from ofxstatement.plugins import mt940_native
+from ofxstatement.plugins.mt940 import Plugin, create_transactions
+
+from helpers import SAMPLES, line_to_dict
+
+
+class NativeTest(TestCase):
+
+    def setUp(self):
+        self.samples = os.path.join(os.path.dirname(__file__), 'samples')
+
+    def read(self, sample):
+        with open(os.path.join(self.samples, sample), 'r') as fh:
+            return fh.read()
+
+    def test_every_sample(self):
+        self.assertEqual(sorted(os.listdir(self.samples)), sorted(SAMPLES))
+
+    def test_same_transactions(self):
+        """The native engine gives the same data as the mt940 library
+        """
+        for sample, bank in SAMPLES.items():
+            data = self.read(sample)
+            expected = create_transactions(bank, None)
+            expected.parse(data)
+            actual = create_transactions(bank, None)
+            mt940_native.parse(actual, data)
+
+            self.assertEqual([t.data for t in actual], [t.data for t in expected], sample)
+            self.assertEqual(actual.data, expected.data, sample)
+
+    def test_same_statement(self):
+        for sample, bank in SAMPLES.items():
+            statements = []
+            for settings in [{}, {'engine': 'native'}, {'engine': 'native', 'workers': '2'}]:
+                parser = Plugin(None, dict(settings, bank_code=bank)).get_parser(os.path.join(self.samples, sample))
+                statements.append(parser.parse())
+                parser.fin.close()
+            for statement in statements[1:]:
+                self.assertEqual([line_to_dict(sl) for sl in statement.lines],
+                                 [line_to_dict(sl) for sl in statements[0].lines],
+                                 sample)
+                for attr in ['account_id', 'currency', 'start_balance', 'start_date', 'end_balance', 'end_date']:
+                    self.assertEqual(getattr(statement, attr), getattr(statements[0], attr), (sample, attr))
+
+    def test_fallback(self):
+        """Tags the native engine does not know are left to the mt940 library
+        """
+        data = self.read('mt940_ASN.txt').replace(':28C:30/1\n', ':28C:30/1\n:34F:EURD0,00\n', 1)
+        with self.assertRaises(mt940_native.Unsupported):
+            mt940_native.parse(create_transactions('ASN', None), data)
+
+        parser = Plugin(None, {'engine': 'native'}).get_file_object_parser(io.StringIO(data))
+        statement = parser.parse()
+        self.assertEqual(len(statement.lines), 9)
+        self.assertIn('d_floor_limit', parser.trs.data)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Plugin(None, {'engine': 'fast'}).get_file_object_parser(io.StringIO(''))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+from datetime import datetime
+from unittest import TestCase, mock
+
+from ofxstatement.ofx import OfxWriter
+from ofxstatement.exceptions import ValidationError
+
+from ofxstatement.plugins.mt940 import Plugin
+from ofxstatement.plugins.mt940_ofx import write_ofx
+
+from helpers import VALID_SAMPLES
+
+
+class StreamingOfxTest(TestCase):
+
+    def convert(self, filename, settings, pretty, streaming):
+        parser = Plugin(None, settings).get_parser(filename)
+        try:
+            if streaming:
+                fout = io.StringIO()
+                statement = write_ofx(parser, fout, pretty=pretty)
+                ofx = fout.getvalue()
+            else:
+                statement = parser.parse()
+                ofx = OfxWriter(statement).toxml(pretty=pretty)
+        finally:
+            parser.fin.close()
+        try:
+            statement.assert_valid()
+            error = None
+        except ValidationError as e:
+            error = e.message
+        return ofx, error
+
+    @mock.patch('ofxstatement.ofx.datetime')
+    def test_same_output(self, ofx_datetime):
+        """Writing while parsing gives the same OFX as OfxWriter
+        """
+        ofx_datetime.now.return_value = datetime(2020, 2, 3, 4, 5, 6)
+        here = os.path.dirname(__file__)
+        for sample, bank in VALID_SAMPLES.items():
+            filename = os.path.join(here, 'samples', sample)
+            for pretty in [False, True]:
+                expected = self.convert(filename, {'bank_code': bank}, pretty, False)
+                actual = self.convert(filename, {'bank_code': bank}, pretty, True)
+                self.assertEqual(actual[0], expected[0], (sample, pretty))
+                # validated on the totals instead of the lines
+                self.assertEqual(actual[1], expected[1], (sample, pretty))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from ofxstatement.plugins.mt940_watch import Watcher
+
+
+class WatchTest(TestCase):
+
+    def setUp(self):
+        here = os.path.dirname(__file__)
+        self.samples = os.path.join(here, 'samples')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.inbox = os.path.join(self.tmpdir.name, 'inbox')
+        self.outbox = os.path.join(self.tmpdir.name, 'outbox')
+        os.makedirs(self.inbox)
+        os.makedirs(self.outbox)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def drop(self, sample, name=None):
+        filename = os.path.join(self.inbox, name or sample)
+        shutil.copy(os.path.join(self.samples, sample), filename)
+        return filename
+
+    def test_scan(self):
+        """A file is ready when it did not change for a while
+        """
+        watcher = Watcher([self.inbox, os.path.join(self.tmpdir.name, 'missing')], {}, settle=1)
+        filename = self.drop('mt940_ASN.txt')
+        self.drop('mt940_ASN.txt', 'mt940_ASN.txt.part')
+        self.drop('mt940_ASN.txt', '.mt940_ASN.txt')
+        self.assertEqual(watcher.scan(0), [])
+        self.assertEqual(watcher.scan(0.5), [])
+
+        # still being written
+        with open(filename, 'a') as fh:
+            fh.write('\n')
+        self.assertEqual(watcher.scan(1), [])
+        self.assertEqual(watcher.scan(1.5), [])
+        ready = watcher.scan(2)
+        self.assertEqual([path for path, _ in ready], [filename])
+        self.assertEqual(watcher.pending, {})
+
+        # converted before, e.g. by a previous run
+        with open(os.path.join(self.inbox, 'mt940_ASN.ofx'), 'w'):
+            pass
+        watcher = Watcher([self.inbox], {}, settle=1)
+        self.assertEqual(watcher.scan(0), [])
+        self.assertEqual(watcher.scan(1), [])
+        self.assertIn(filename, watcher.done)
+
+        os.remove(filename)
+        watcher.scan(2)
+        self.assertEqual(watcher.done, {})
+
+    def test_same_output_file(self):
+        """A file is skipped when another one is converted into the same
+        OFX file
+        """
+        other = os.path.join(self.tmpdir.name, 'other')
+        os.makedirs(other)
+        watcher = Watcher([self.inbox, other], {}, output_dir=self.outbox, settle=1)
+        filename = self.drop('mt940_ASN.txt', 'x.sta')
+        self.drop('mt940_ASN.txt', 'x.txt')
+        shutil.copy(filename, os.path.join(other, 'x.sta'))
+        with self.assertLogs('ofxstatement.plugins.mt940_watch', 'ERROR') as logs:
+            watcher.scan(0)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual([path for path, _ in watcher.scan(1)], [filename])
+        self.assertEqual(len(watcher.skipped), 2)
+
+        # the other one once the first is gone
+        os.remove(filename)
+        watcher.scan(2)
+        self.assertEqual([path for path, _ in watcher.scan(3)], [os.path.join(self.inbox, 'x.txt')])
+
+    def test_run(self):
+        """The files dropped are converted till the watcher stops
+        """
+        watcher = Watcher([self.inbox], {}, output_dir=self.outbox, jobs=2, interval=0.05, settle=0.1)
+        output_file = os.path.join(self.outbox, 'mt940_ASN.ofx')
+        latencies = []
+
+        async def drop_files(stop):
+            for sample in ['mt940_ASN.txt', 'mt940_ASN_end_date_wrong.txt']:
+                self.drop(sample)
+            start = time.monotonic()
+            while not os.path.exists(output_file) or len(watcher.done) < 2:
+                await asyncio.sleep(0.01)
+            latencies.append(time.monotonic() - start)
+            stop.set()
+
+        async def main():
+            stop = asyncio.Event()
+            await asyncio.gather(watcher.run(stop), drop_files(stop))
+
+        asyncio.run(asyncio.wait_for(main(), 30))
+        self.assertLess(latencies[0], 10)
+        with open(output_file) as fh:
+            self.assertIn('<ACCTID>NL81ASNB9999999999</ACCTID>', fh.read())
+        # the file that failed is not retried
+        self.assertEqual(os.listdir(self.outbox), ['mt940_ASN.ofx'])
+        self.assertEqual(len(watcher.done), 2)
+        self.assertIsNone(watcher.executor)